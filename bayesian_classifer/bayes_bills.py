@@ -1,113 +1,8 @@
-import sys, time, math, os, json, pickle
+import sys, time, os, json, multiprocessing, sqlite3
+from collections import OrderedDict
 from pprint import pprint
 
-class classifier:
-    def __init__(self, getfeatures, filename=None):
-        # Counts of feature/category combinations
-        self.fc = {}
-        # Counts of documents in each category
-        self.cc = {}
-        self.getfeatures = getfeatures
-      
-    # Increase the count of a feature/category pair
-    def incf(self,f,cat):
-        self.fc.setdefault(f,{})
-        self.fc[f].setdefault(cat,0)
-        self.fc[f][cat]+=1
-
-    # Increase the count of a category
-    def incc(self,cat):
-        self.cc.setdefault(cat,0)
-        self.cc[cat]+=1
-
-    # The number of times a feature has appeared in a category
-    def fcount(self,f,cat):
-        if f in self.fc and cat in self.fc[f]: 
-            return float(self.fc[f][cat])
-        return 0.0
-
-    # The number of items in a category
-    def catcount(self,cat):
-        if cat in self.cc:
-            return float(self.cc[cat])
-        return 0
-
-    # The total number of items
-    def totalcount(self):
-        return sum(self.cc.values())
-
-    # The list of all categories
-    def categories(self):
-        return self.cc.keys()
-
-    def train(self,item):
-        features, cat = self.getfeatures(item)
-        # Increment the count for every feature with this category
-        for f in features:
-            self.incf(f,cat)
-
-      # Increment the count for this category
-        self.incc(cat)
-
-    def fprob(self,f,cat):
-        if self.catcount(cat)==0: return 0
-
-      # The total number of times this feature appeared in this 
-      # category divided by the total number of items in this category
-        return self.fcount(f,cat)/self.catcount(cat)
-
-    def weightedprob(self,f,cat,prf,weight=1.0,ap=0.5):
-        # Calculate current probability
-        basicprob=prf(f,cat)
-
-        # Count the number of times this feature has appeared in
-        # all categories
-        totals=sum([self.fcount(f,c) for c in self.categories()])
-
-        # Calculate the weighted average
-        bp=((weight*ap)+(totals*basicprob))/(weight+totals)
-        return bp
-
-class naivebayes(classifier):
-    def __init__(self,getfeatures):
-        classifier.__init__(self, getfeatures)
-        self.thresholds={}
-
-    def docprob(self,item,cat):
-        features = self.getfeatures(item)[0]
-
-        # Multiply the probabilities of all the features together
-        p = 1
-        for f in features: p += math.log(self.weightedprob(f,cat,self.fprob))
-        return -1*p
-
-    def prob(self,item,cat):
-        catprob = self.catcount(cat)/self.totalcount()
-        docprob = self.docprob(item,cat)
-        return 100.0 - (docprob * catprob)
-
-    def setthreshold(self,cat,t):
-        self.thresholds[cat]=t
-
-    def getthreshold(self,cat):
-        if cat not in self.thresholds: return 1.0
-        return self.thresholds[cat]
-
-    def classify(self,item,default = None):
-        probs={}
-        # Find the category with the highest probability
-
-        max = 0.0
-        best = 0
-        for cat in self.categories():
-          probs[cat] = self.prob(item,cat)
-          if probs[cat] > max: 
-            max = probs[cat]
-            best = cat
-        for cat in probs:
-          if cat==best: continue
-          if probs[cat]*self.getthreshold(best)>probs[best]: return default
-        return 1 - best
+from classifier import cached, trainparallel, classifyparallel, extractorid
 
 # because there are too many bill_statuses to be useful, we will group them into XXX categories:
 # 1. became law
@@ -122,7 +17,7 @@ def process_states_simple(status):
 
 # takes a path to a bill and creates a dictionary that maps a feature to it's value
 # in this case we are just going to map a feature to it's status
-def getBillFeatures(billPath):
+def parseBill(billPath):
     feature_dict = {}
     status = ""
     with open(billPath) as data_file:
@@ -140,21 +35,119 @@ def getBillFeatures(billPath):
 
     return feature_dict, status
 
-def trainForCongress(predictor, billPath):
-    file_count = 0
-    for path, dirs, files in os.walk(billPath):
-        file_count += len(files)
-    i = 0
+# Keeps parsed bills keyed by path and modification time, so evaluating the same
+# bills again never re-parses the files that haven't changed. The most recently
+# used `size` bills are kept in memory; with persist() the parsed bills are also
+# kept in an SQLite file that outlives the process. Newly parsed bills are only
+# written to it by flush(), so each shard of bills is one transaction
+class BillCache:
+    def __init__(self, size = 50000):
+        self.entries = OrderedDict()
+        self.size = size
+        self.path = None
+        self.db = None
+        self.pending = []
+
+    def persist(self, path):
+        self.path = path
+        self.db = None
+
+    # the connection is opened lazily in each process, since forked pool
+    # workers can't share their parent's
+    def connect(self):
+        if self.db is None or self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.db = sqlite3.connect(self.path, timeout = 30)
+            self.db.execute("pragma synchronous = off")
+            self.db.execute("create table if not exists meta (parser text)")
+            self.db.execute("create table if not exists bills (path text primary key, mtime integer, parsed text)")
+
+            # bills parsed by a different version of parseBill are thrown away
+            parser = extractorid(parseBill)
+            if self.db.execute("select parser from meta").fetchone() != (parser,):
+                with self.db:
+                    self.db.execute("delete from meta")
+                    self.db.execute("delete from bills")
+                    self.db.execute("insert into meta values (?)", (parser,))
+        return self.db
+
+    def get(self, billPath):
+        mtime = os.stat(billPath).st_mtime_ns
+        entry = self.entries.get(billPath)
+        if entry is not None and entry[0] == mtime:
+            self.entries.move_to_end(billPath)
+            return entry[1]
+
+        parsed = None
+        if self.path is not None:
+            row = self.connect().execute("select mtime, parsed from bills where path = ?", (billPath,)).fetchone()
+            if row is not None and row[0] == mtime:
+                parsed = tuple(json.loads(row[1]))
+
+        if parsed is None:
+            parsed = parseBill(billPath)
+            if self.path is not None:
+                self.pending.append((billPath, mtime, json.dumps(parsed)))
+
+        self.entries[billPath] = (mtime, parsed)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last = False)
+        return parsed
+
+    # writes the bills parsed since the last flush to the SQLite file
+    def flush(self):
+        if self.path is not None and self.pending:
+            with self.connect() as db:
+                db.executemany("insert or replace into bills values (?, ?, ?)", self.pending)
+        self.pending = []
+
+billCache = BillCache()
+
+# returns a bill's features and status, parsing the file only if it isn't cached
+def getBillFeatures(billPath):
+    return billCache.get(billPath)
+
+def flushBills():
+    billCache.flush()
+
+# the classifier only needs a bill's features, its status is the category
+def getBillSubjects(billPath):
+    return getBillFeatures(billPath)[0]
+
+def trainBillFiles(predictor, billPaths):
+    for billPath in billPaths:
+        features, status = getBillFeatures(billPath)
+        predictor.trainfeatures(features, status)
+    flushBills()
+
+# trains on every bill under billPath. unless processes is 1 the bills are split
+# into shards and parsed by a pool of `processes` workers (all cores if None)
+def trainForCongress(predictor, billPath, processes = None):
+    billPaths = []
     for path, dirs, files in os.walk(billPath):
-        # file_count = len(dirs) * len(files)
         for data_file in files:
             if ".json" in data_file:
             # we only want to read the .json files because we don't want to read the same data twice
-                predictor.train(path + "/" + data_file)
+                billPaths.append(path + "/" + data_file)
+
+    if processes == 1:
+        for i, bill in enumerate(billPaths):
+            features, status = getBillFeatures(bill)
+            predictor.trainfeatures(features, status)
 
-                sys.stdout.flush()
-                sys.stdout.write("\r\t\ttrained %d/%d bills... " % (i + 1, file_count))
-            i += 1
+            sys.stdout.flush()
+            sys.stdout.write("\r\t\ttrained %d/%d bills... " % (i + 1, len(billPaths)))
+        flushBills()
+    else:
+        workers = processes or multiprocessing.cpu_count()
+        # a few shards per worker keeps the pool busy when some shards are slower
+        size = max(1, -(-len(billPaths) // (workers * 4)))
+        shards = [billPaths[i:i + size] for i in range(0, len(billPaths), size)]
+
+        def done(count):
+            sys.stdout.flush()
+            sys.stdout.write("\r\t\ttrained %d/%d shards... " % (count, len(shards)))
+        trainparallel(predictor, shards, trainBillFiles, processes, done)
     print("finished %s" % billPath)
 
 def trainFeatureDict(predictor):
@@ -163,26 +156,36 @@ def trainFeatureDict(predictor):
     trainForCongress(predictor, "data/bills_112")
     print("\t\t--> done training!")
 
-def predictOutcomes(predictor):
+# classifies every bill in the 113th congress, parsing each bill once. given the
+# path the predictor was saved to, the bills are spread over a pool of
+# `processes` workers (all cores if None) that each map the saved model
+def predictOutcomes(predictor, modelPath = None, processes = None):
     print("Predicting Outcomes for 113th congress...")
-    outcomes = [0,0]
-    bill_count = 0
-    for path, dirs, files in os.walk("data/bills_113"):
-        bill_count += len(files)
-    bill = 0
+    bills = []
     for path, dirs, files in os.walk("data/bills_113"):
         for data_file in files:
-            bill += 1
-
-            actual = predictor.getfeatures(path + "/" + data_file)[1]
-            predicted = predictor.classify(path + "/" + data_file)
+            bills.append(path + "/" + data_file)
+
+    def progress(bill):
+        sys.stdout.flush()
+        sys.stdout.write("\r\tclassified bill %d/%d..." % (bill, len(bills)))
+
+    if modelPath is None or processes == 1:
+        results = []
+        for bill in bills:
+            features, actual = getBillFeatures(bill)
+            results.append((predictor.classifyfeatures(features), actual))
+            progress(len(results))
+        flushBills()
+    else:
+        results = classifyparallel(modelPath, predictor.getfeatures, bills, getBillFeatures, processes,
+                                   done=progress, finish=flushBills)
 
-            outcomes[0] += 1 if (actual == predicted) else 0
-            outcomes[1] += 1
+    outcomes = [0,0]
+    for predicted, actual in results:
+        outcomes[0] += 1 if (actual == predicted) else 0
+        outcomes[1] += 1
 
-            sys.stdout.flush()
-            sys.stdout.write("\r\tclassified bill %d/%d..." % (bill, bill_count))
-    
     print("Done!\n")
     print("Accuracy --> %.5f%% for %d bills" % (100*outcomes[0]/outcomes[1], outcomes[1]))
 
@@ -200,22 +203,19 @@ def main():
         return
 
     start = time.time()
-    congressional_predictor = "maybe?"
+    billCache.persist("data/bill_features.db")
     print("Creating Classifier...")
 
-    if not os.path.isfile("predictor.bayes"):
-        print("\tGenerating...")
-        congressional_predictor = naivebayes(getBillFeatures)
-        trainFeatureDict(congressional_predictor)
-
-        save_file = open("predictor.bayes", "wb+")
-        pickle.dump(congressional_predictor, save_file)
+    congressional_predictor, trained = cached("predictor.model", getBillSubjects,
+                                              ["data/bills_111", "data/bills_112"],
+                                              trainForCongress, flip=True)
+    if trained:
+        print("\t\t--> done training!")
     else:
         print("\tLoaded from file")
-        save_file = open("predictor.bayes", "rb")
-        congressional_predictor = pickle.load(save_file)
 
-    predictOutcomes(congressional_predictor)
+    congressional_predictor.compile()
+    predictOutcomes(congressional_predictor, "predictor.model")
     totalTime = time.time() - start
     message = "\nTime for this run: " + ("%2d:%2d" % (totalTime/60, totalTime%60)).replace(" ", "0")
 
@@ -1,115 +1,20 @@
 import time
 import sys
 import os
-import pickle
-import math
-
-class classifier:
-    def __init__(self, getfeatures, filename=None):
-        # Counts of feature/category combinations
-        self.fc = {}
-        # Counts of documents in each category
-        self.cc = {}
-        self.getfeatures = getfeatures
-      
-    # Increase the count of a feature/category pair
-    def incf(self,f,cat):
-        self.fc.setdefault(f,{})
-        self.fc[f].setdefault(cat,0)
-        self.fc[f][cat]+=1
-
-    # Increase the count of a category
-    def incc(self,cat):
-        self.cc.setdefault(cat,0)
-        self.cc[cat]+=1
-
-    # The number of times a feature has appeared in a category
-    def fcount(self,f,cat):
-        if f in self.fc and cat in self.fc[f]: 
-            return float(self.fc[f][cat])
-        return 0.0
-
-    # The number of items in a category
-    def catcount(self,cat):
-        if cat in self.cc:
-            return float(self.cc[cat])
-        return 0
-
-    # The total number of items
-    def totalcount(self):
-        return sum(self.cc.values())
-
-    # The list of all categories
-    def categories(self):
-        return self.cc.keys()
-
-    def train(self,item, cat):
-        features = self.getfeatures(item)
-        # Increment the count for every feature with this category
-        for f in features:
-            self.incf(f,cat)
-
-      # Increment the count for this category
-        self.incc(cat)
-
-    def fprob(self,f,cat):
-        if self.catcount(cat)==0: return 0
-
-      # The total number of times this feature appeared in this 
-      # category divided by the total number of items in this category
-        return self.fcount(f,cat)/self.catcount(cat)
-
-    def weightedprob(self,f,cat,prf,weight=1.0,ap=0.5):
-        # Calculate current probability
-        basicprob=prf(f,cat)
-
-        # Count the number of times this feature has appeared in
-        # all categories
-        totals=sum([self.fcount(f,c) for c in self.categories()])
-
-        # Calculate the weighted average
-        bp=((weight*ap)+(totals*basicprob))/(weight+totals)
-        return bp
-
-class naivebayes(classifier):
-    def __init__(self,getfeatures):
-        classifier.__init__(self, getfeatures)
-        self.thresholds={}
-
-    def docprob(self,item,cat):
-        features = self.getfeatures(item)
-
-        # Multiply the probabilities of all the features together
-        p = 1
-        for f in features: p += math.log(self.weightedprob(f,cat,self.fprob))
-        return -1*p
-
-    def prob(self,item,cat):
-        catprob = self.catcount(cat)/self.totalcount()
-        docprob = self.docprob(item,cat)
-        return 100.0 - (docprob * catprob)
-
-    def setthreshold(self,cat,t):
-        self.thresholds[cat]=t
-
-    def getthreshold(self,cat):
-        if cat not in self.thresholds: return 1.0
-        return self.thresholds[cat]
-
-    def classify(self,item,default = None):
-        probs={}
-        # Find the category with the highest probability
-
-        max = 0.0
-        for cat in self.categories():
-          probs[cat] = self.prob(item,cat)
-          if probs[cat] > max: 
-            max = probs[cat]
-            best = cat
-        for cat in probs:
-          if cat==best: continue
-          if probs[cat]*self.getthreshold(best)>probs[best]: return default
-        return 1 - best
+import multiprocessing
+import sqlite3
+from array import array
+from contextlib import closing
+from itertools import groupby
+
+import classifier
+import metrics
+from classifier import naivebayes, cached, trainparallel, load, applydelta, stamp
+
+# the repository root, so the distilled formats in helpers/ can be imported
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.columnar import Columnar, columnar_path
+from helpers import instrument
 
 def get_features(data):
     # needs to return feature dictionary, and the classification
@@ -124,75 +29,304 @@ def get_features(data):
 
     return features
 
-def train_with_distilled(predictor, input_csv = "data_distilled/distilled_bills_1NF.csv"):
-    csv_file = open(input_csv, "r")
+# splits a distilled line into the classifier's item, and the actual result.
+# raises ValueError for lines that don't have a sponsor, a result and subjects
+def parse_line(line):
+    row = line.rstrip("\n").split("\t")
+    if len(row) < 3:
+        raise ValueError("expected 3 tab separated columns, found %d" % len(row))
+    sponsor = row[0]
+    result = int(row[1])
+    subjects = row[2].split("|")
+    return [sponsor, subjects], result
+
+# streams (item, result) pairs out of a distilled file without reading the whole
+# file in, optionally only the lines that start between the byte offsets start
+# and end. malformed rows (bills without subjects are distilled with only two
+# columns) aren't yielded, their line numbers (counted from start) are appended
+# to skipped if given. columnar (.col) files are read through read_columnar
+def read_distilled(path, skipped = None, start = 0, end = None):
+    if path.endswith(".col"):
+        yield from read_columnar(path, skipped, start, end)
+        return
+
+    with open(path, "rb", buffering = 1 << 20) as csv_file:
+        csv_file.seek(start)
+        position = start
+        for number, line in enumerate(csv_file, 1):
+            if end is not None and position >= end: break
+            position += len(line)
+
+            try:
+                row = parse_line(line.decode("utf-8"))
+            except ValueError:
+                if skipped is not None: skipped.append(number)
+                continue
+            yield row
+
+# the same rows as read_distilled for a columnar file, where start and end are
+# bill numbers. bills without subjects are skipped like the two column rows
+def read_columnar(path, skipped = None, start = 0, end = None):
+    for number, (sponsor, status, subjects) in enumerate(Columnar(path).rows(start, end), 1):
+        if not subjects:
+            if skipped is not None: skipped.append(number)
+            continue
+        yield [sponsor, subjects], status
+
+# the columnar version of a distilled file if helpers/distill.py has written one
+# that is at least as new, otherwise the tab separated file
+def distilled_input(path):
+    col = columnar_path(path)
+    if os.path.isfile(col) and os.path.getmtime(col) >= os.path.getmtime(path):
+        return col
+    return path
+
+# splits a distilled file into `count` byte ranges that start on line boundaries,
+# or bill ranges for a columnar file
+def distilled_shards(path, count):
+    if path.endswith(".col"):
+        bills = len(Columnar(path))
+        bounds = [bills * i // count for i in range(count + 1)]
+        return [(path, bounds[i], bounds[i + 1]) for i in range(count) if bounds[i] < bounds[i + 1]]
+
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as csv_file:
+        for i in range(1, count):
+            csv_file.seek(size * i // count)
+            csv_file.readline()
+            bounds.append(max(csv_file.tell(), bounds[-1]))
+    bounds.append(size)
+    return [(path, bounds[i], bounds[i + 1]) for i in range(count) if bounds[i] < bounds[i + 1]]
+
+def train_distilled_shard(predictor, shard):
+    path, start, end = shard
+    for data, result in read_distilled(path, start = start, end = end):
+        predictor.train(data, result)
+
+# trains on a distilled file, split over `processes` worker processes (all cores
+# if None) unless processes is 1
+def train_with_distilled(predictor, input_csv = "data_distilled/distilled_bills_1NF.csv", progress = 0, processes = 1):
+    if processes != 1:
+        shards = distilled_shards(input_csv, processes or multiprocessing.cpu_count())
+        trainparallel(predictor, shards, train_distilled_shard, processes)
+        return
 
-    for line in csv_file.readlines():
-
-        try:
-            row = line.split("\t")
-            sponsor = row[0]
-            result = int(row[1])
-            subjects = row[2][:-1].split("|") # we use the [:-1] because we don't want to include the new line
-            data = [sponsor, subjects]
-            predictor.train(data, result)
+    seen = 0
+    for data, result in read_distilled(input_csv):
+        predictor.train(data, result)
 
-            seen += 1
+        seen += 1
+        if progress and seen % progress == 0:
+            sys.stdout.write("\rTrained %d bills" % seen)
+            sys.stdout.flush()
 
+# classifies every item in one batch against the compiled model
+def classify_many(predictor, rows, default = None):
+    return predictor.batchclassify(rows, default)
+
+# returns the predicted and actual outcomes for every bill in a distilled file,
+# classifying them in batches as the file is streamed in.
+# progress is written every `progress` bills, or never if it is 0
+def predict_file(predictor, path, progress = 0, skipped = None):
+    return predict_rows(predictor, read_distilled(path, skipped), progress)
+
+# the same for any iterable of (item, result) pairs. each batch is decided as
+# soon as it is scored, so only the predictions are kept
+def predict_rows(predictor, rows, progress = 0):
+    predicted = []
+    actual = []
+    for probs, results in scored_batches(predictor, rows, progress):
+        predicted += [predictor.decide(bill_probs) for bill_probs in probs]
+        actual += results
+    return predicted, actual
+
+# the raw featureprobs of every bill and the actual outcomes, for when the
+# probabilities themselves are needed: enacted_scores turns them into one
+# score per bill
+def score_rows(predictor, rows, progress = 0):
+    probs = []
+    actual = []
+    for batch_probs, results in scored_batches(predictor, rows, progress):
+        probs += batch_probs
+        actual += results
+    return probs, actual
+
+# yields the featureprobs and actual outcomes of the bills in batches, scored
+# against the compiled model
+def scored_batches(predictor, rows, progress = 0):
+    batch = []
+    actual = []
+    scored = 0
+    step = progress or 1000
+
+    for data, result in rows:
+        batch.append(data)
+        actual.append(result)
+        if len(batch) == step:
+            scored += len(batch)
+            yield predictor.batchprobs(batch), actual
+            batch = []
+            actual = []
+            if progress:
+                sys.stdout.write("\rClassified %d bills... " % scored)
+                sys.stdout.flush()
+
+    if batch:
+        scored += len(batch)
+        yield predictor.batchprobs(batch), actual
+        if progress:
+            sys.stdout.write("\rClassified %d bills... " % scored)
             sys.stdout.flush()
-            sys.stdout.write("\rTrained %d bills" % seen)
-        except:
-            pass
-            
-def predictOutcomes(predictor):
-    print("Predicting Outcomes for 113th congress...")
-    csv_file = open("data_distilled/data_distilled_113.csv", "r")
 
-    outcomes = [0,0]
+# how strongly the predictor leans towards "enacted" for each bill: the
+# probability of the category it answers 1 for over the other one's. decide()
+# answers enacted for scores above 1 (when that probability is positive).
+# long bills can push a probability below 0; if the other one isn't positive
+# the score is +/-inf depending on which is higher
+def enacted_scores(predictor, probs):
+    enacted = [cat for cat in predictor.categories() if (1 - cat if predictor.flip else cat) == 1]
+    others = [cat for cat in predictor.categories() if cat not in enacted]
+    if len(enacted) != 1 or len(others) != 1:
+        raise ValueError("expected one enacted and one other category, found %r" % list(predictor.categories()))
+    enacted, other = enacted[0], others[0]
+
+    scores = array('d')
+    for bill_probs in probs:
+        if bill_probs[other] > 0:
+            scores.append(bill_probs[enacted] / bill_probs[other])
+        else:
+            scores.append(float("inf") if bill_probs[enacted] > bill_probs[other] else float("-inf"))
+    return scores
+
+# trains on the bills of the given congresses in an SQLite database loaded by
+# `helpers/distill.py --3NF`, letting SQLite aggregate the counts. like the
+# distilled files, only bills with at least one subject are counted
+def train_from_store(predictor, database, congresses):
+    marks = ", ".join("?" for congress in congresses)
+    tagged = "select distinct bill_id from bills_subjects where congress in (%s)" % marks
+    with closing(sqlite3.connect(database)) as connection:
+        ccounts = connection.execute(
+            "select status, count(*) from bills where congress in (%s) and bill_id in (%s) "
+            "group by status order by min(rowid)" % (marks, tagged), congresses * 2).fetchall()
+        subjects = connection.execute(
+            "select s.subject, b.status, count(distinct b.bill_id) from bills_subjects s "
+            "join bills b on b.bill_id = s.bill_id where s.congress in (%s) "
+            "group by s.subject, b.status" % marks, congresses).fetchall()
+        sponsors = connection.execute(
+            "select sponsor, status, count(*) from bills where congress in (%s) and bill_id in (%s) "
+            "group by sponsor, status" % (marks, tagged), congresses * 2).fetchall()
+    predictor.traincounts(subjects + sponsors, ccounts)
+
+# yields the (item, result) pair of every bill with subjects in one congress of the
+# database, through the congress index, in the order the bills were loaded
+def read_store(database, congress):
+    with closing(sqlite3.connect(database)) as connection:
+        rows = connection.execute(
+            "select b.bill_id, b.sponsor, b.status, s.subject from bills b "
+            "join bills_subjects s on s.bill_id = b.bill_id where b.congress = ? "
+            "order by b.rowid, s.rowid", (congress,))
+        for bill_id, bill_rows in groupby(rows, key = lambda row: row[0]):
+            bill_rows = list(bill_rows)
+            yield [bill_rows[0][1], [row[3] for row in bill_rows]], bill_rows[0][2]
+
+# moves the window of congresses a saved model covers along: trains on the bills
+# in the distilled files `added` and takes back the ones in `dropped`, touching
+# only those bills. the model's input stamps are updated to match, so cached()
+# keeps reusing it for the new window
+def roll_window(model_path, added = (), dropped = ()):
+    inputs = [trained for trained in load(model_path, get_features).inputs if trained[0] not in dropped]
+    inputs += [stamp(path) for path in added]
+
+    def rows(paths):
+        for path in paths:
+            yield from read_distilled(path)
+    return applydelta(model_path, get_features, rows(added), rows(dropped), inputs)
+
+# returns the number of correct predictions and the number of predictions made
+def accuracy(predicted, actual):
+    correct = sum(1 for p, a in zip(predicted, actual) if p == a)
+    return correct, len(actual)
+
+# prints the cut-off table and calibration of the enacted_scores of some bills
+def print_evaluation(scores, actual):
+    table = metrics.threshold_table(scores, actual)
+    print("\nBest score cut-offs by F1:")
+    print("cut-off        precision  recall    f1        accuracy")
+    for row in metrics.best_thresholds(table):
+        print("%-14.9g %-10.5f %-9.5f %-9.5f %.5f" % (row[0], row[5], row[6], row[7], row[8]))
+
+    print("\nEnacted rate by score decile:")
+    print("scores                        bills   enacted")
+    for low, high, bills, rate in metrics.calibration(scores, actual):
+        print("%.9g - %-16.9g %-7d %.5f" % (low, high, bills, rate))
+
+# evaluate also prints the score cut-off table and calibration deciles
+def predictOutcomes(predictor, progress = 1000, database = None, evaluate = False):
+    print("Predicting Outcomes for 113th congress...")
+    if database is None:
+        rows = read_distilled(distilled_input("data_distilled/data_distilled_113.csv"))
+    else:
+        rows = read_store(database, 113)
+    probs, actual = score_rows(predictor, rows, progress)
+    predicted = [predictor.decide(bill_probs) for bill_probs in probs]
+    outcomes = accuracy(predicted, actual)
 
-    seen = 0
-    for line in csv_file.readlines():
-
-        try:
-            row = line.split("\t")
-            sponsor = row[0]
-            result = int(row[1])
-            subjects = row[2][:-1].split("|") # we use the [:-1] because we don't want to include the new line
-            data = [sponsor, subjects]
-            predicted = predictor.classify(data)
-
-            seen += 1
-            outcomes[0] += 1 if (result == predicted) else 0
-            outcomes[1] += 1
-        except:
-            pass
-
-        sys.stdout.flush()
-        sys.stdout.write("\rClassified %d bills... " % seen)
-    
     print("Done!\n")
     print("Accuracy --> %.5f%% for %d bills" % (100*outcomes[0]/outcomes[1], outcomes[1]))
 
+    scores = enacted_scores(predictor, probs)
+    print("ROC-AUC  --> %.5f (%.5f%% of the bills were enacted)" % (metrics.roc_auc(scores, actual), 100.0*sum(actual)/len(actual)))
+    if evaluate:
+        print_evaluation(scores, actual)
+
 def main():
     start = time.time()
-
-    predictor = "maybe?"
-
-    if not os.path.isfile("distilled_predictor.bayes"):
-        print("Generating...")
-        predictor = naivebayes(get_features)
-        train_with_distilled(predictor, "data_distilled/data_distilled_111.csv")
-        train_with_distilled(predictor, "data_distilled/data_distilled_112.csv")
-
-        save_file = open("distilled_predictor.bayes", "wb+")
-        pickle.dump(predictor, save_file)
+    evaluate = "--evaluate" in sys.argv
+    if evaluate: sys.argv.remove("--evaluate")
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--store":
+        # trains and predicts from the SQLite database written by `helpers/distill.py --3NF`
+        predictor = naivebayes(get_features, flip=True)
+        train_from_store(predictor, sys.argv[2], [111, 112])
+        print("Trained from %s" % sys.argv[2])
+        predictor.compile()
+        predictOutcomes(predictor, database = sys.argv[2], evaluate = evaluate)
+        return
+
+    predictor, trained = cached("distilled_predictor.model", get_features,
+                                [distilled_input("data_distilled/data_distilled_111.csv"),
+                                 distilled_input("data_distilled/data_distilled_112.csv")],
+                                train_with_distilled, flip=True)
+    if trained:
+        print("Generating... (trained on %s)" % ", ".join(trained))
     else:
-        save_file = open("distilled_predictor.bayes", "rb")
-        predictor = pickle.load(save_file)
         print("Loaded from file")
 
-    predictOutcomes(predictor)
+    predictor.compile()
+    predictOutcomes(predictor, evaluate = evaluate)
+
+# the functions timed when the script is run with --instrument or PREDICT_INSTRUMENT
+# set (see helpers/instrument.py), as (owner, name, stage)
+def instrumented():
+    module = sys.modules[__name__]
+    return [(module, "read_distilled", "io"),
+            (module, "parse_line", "parse"),
+            (module, "get_features", "extract"),
+            (naivebayes, "trainfeatures", "train"),
+            (naivebayes, "traincounts", "train"),
+            (classifier.classifier, "weightedprob", "weightedprob"),
+            (naivebayes, "compile", "compile"),
+            (naivebayes, "featureprobs", "score"),
+            (naivebayes, "decide", "decide"),
+            (naivebayes, "save", "save"),
+            (classifier, "load", "load"),
+            (module, "load", "load")]
 
 if __name__ == "__main__":
-    main()
+    modes = instrument.requested()
+    if modes:
+        instrument.run(main, modes, instrumented())
+    else:
+        main()
 
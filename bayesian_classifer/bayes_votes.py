@@ -1,216 +1,288 @@
 from pprint import pprint
 # from matplotlib import pyplot as plt
-import sys, time, math, os, json
-
-class classifier:
-    def __init__(self, getfeatures, filename=None):
-        # Counts of feature/category combinations
-        self.fc = {}
-        # Counts of documents in each category
+import sys, time, math, os, json, multiprocessing
+from array import array
+from operator import itemgetter
+
+from classifier import naivebayes
+
+# the repository root, so the bill index in helpers/ can be imported
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.bill_index import bill_index, bill_key
+
+# Predicts how each legislator votes on a bill from how they have voted on the
+# bill's subjects before. Every (voter, subject) pair of a roll call is one item
+# with one feature, so instead of going through naivebayes one pair at a time
+# the counts are kept in a voter x subject matrix per category (yea/nay).
+#
+# Voter ids and subjects are interned to integers; fc[cat][voter] is an
+# array('I') row of counts indexed by subject. The probabilities a pair gets
+# only depend on its counts in each category, so the decision for every
+# distinct tuple of counts is worked out once, the way naivebayes would, and
+# a whole roll call is scored by reading the voters' rows for the bill's
+# subjects and looking the count tuples up.
+class voteclassifier:
+    def __init__(self, weight=1.0, ap=0.5):
+        self.weight = weight
+        self.ap = ap
+        self.flip = False
+        self.thresholds = {}
+        self.voters = {}
+        self.subjects = {}
+        # categories in the order they were first trained on, like naivebayes
+        self.cats = []
         self.cc = {}
-        self.getfeatures = getfeatures
-      
-    # Increase the count of a feature/category pair
-    def incf(self,f,cat):
-        self.fc.setdefault(f,{})
-        self.fc[f].setdefault(cat,0)
-        self.fc[f][cat]+=1
-
-    # Increase the count of a category
-    def incc(self,cat):
-        self.cc.setdefault(cat,0)
-        self.cc[cat]+=1
-
-    # The number of times a feature has appeared in a category
-    def fcount(self,f,cat):
-        if f in self.fc and cat in self.fc[f]: 
-            return float(self.fc[f][cat])
-        return 0.0
-
-    # The number of items in a category
-    def catcount(self,cat):
-        if cat in self.cc:
-            return float(self.cc[cat])
-        return 0
-
-    # The total number of items
-    def totalcount(self):
-        return sum(self.cc.values())
-
-    # The list of all categories
-    def categories(self):
-        return self.cc.keys()
-
-    def train(self,item, cat):
-        features = self.getfeatures(item)
-        # Increment the count for every feature with this category
-        for f in features:
-            self.incf(f,cat)
-
-      # Increment the count for this category
-        self.incc(cat)
-
-    def fprob(self,f,cat):
-        if self.catcount(cat)==0: return 0
-
-      # The total number of times this feature appeared in this 
-      # category divided by the total number of items in this category
-        return self.fcount(f,cat)/self.catcount(cat)
-
-    def weightedprob(self,f,cat,prf,weight=1.0,ap=0.5):
-        # Calculate current probability
-        basicprob=prf(f,cat)
-
-        # Count the number of times this feature has appeared in
-        # all categories
-        totals=sum([self.fcount(f,c) for c in self.categories()])
-
-        # Calculate the weighted average
-        bp=((weight*ap)+(totals*basicprob))/(weight+totals)
-        return bp
-
-class naivebayes(classifier):
-    def __init__(self,getfeatures):
-        classifier.__init__(self, getfeatures)
-        self.thresholds={}
-
-    def docprob(self,item,cat):
-        features = self.getfeatures(item)
-
-        # Multiply the probabilities of all the features together
-        p = 1
-        for f in features: p += math.log(self.weightedprob(f,cat,self.fprob))
-        return -1*p
-
-    def prob(self,item,cat):
-        catprob = self.catcount(cat)/self.totalcount()
-        docprob = self.docprob(item,cat)
-        return 100.0 - (docprob * catprob)
-
-    def setthreshold(self,cat,t):
-        self.thresholds[cat]=t
-
-    def getthreshold(self,cat):
-        if cat not in self.thresholds: return 1.0
-        return self.thresholds[cat]
-
-    def classify(self,item,default = None):
-        probs={}
-        # Find the category with the highest probability
-
-        max = 0.0
-        for cat in self.categories():
-          probs[cat] = self.prob(item,cat)
-          if probs[cat] > max: 
-            max = probs[cat]
-            best = cat
-        for cat in probs:
-          if cat==best: continue
-          if probs[cat]*self.getthreshold(best)>probs[best]: return default
-        return best
-
-def getVoteFeatures(vote_data):
-    feature_dict = {}
-    voter = vote_data[0]["id"]
-    subject = vote_data[1]
-
-    feature_dict[(voter, subject)] = 1
-
-    return feature_dict
-
-
-def parseFeatures(predictor, votePath):
-    with open(votePath) as vote_file:
-        vote_data = json.load(vote_file)
-
-        try: 
-            billPath = "data/bills_%d/%s/%s%d/data.json" % (
-                vote_data["bill"]["congress"],
-                vote_data["bill"]["type"],
-                vote_data["bill"]["type"],
-                vote_data["number"] )
-
-            with open(billPath) as bill_file:
-                bill_data = json.load(bill_file)
-
-            for status in vote_data["votes"].keys():
-                for vote in vote_data["votes"][status]:
-                    for subject in bill_data["subjects"]:
-                        # we are essentially how a particular voter has voted on each subject in the past
-                        predictor.train((vote, subject), group(status))
-        except:
-            pass
-
-    vote_file.close()
-
-def trainPredictor(predictor, votePath = "data/votes_111"):
-    fileCount = 0
-    for path, dirs, files in os.walk(votePath):
-        for data_file in files:
-            fileCount += 1
-
-    i = 0
+        self.fc = {}
+        self.total = 0
+        # count tuple -> decision, only valid until the counts or thresholds change
+        self.decisions = {}
+
+    # decide() and the thresholds work like naivebayes's
+    getthreshold = naivebayes.getthreshold
+    decide = naivebayes.decide
+
+    def setthreshold(self, cat, t):
+        naivebayes.setthreshold(self, cat, t)
+        self.decisions.clear()
+
+    def internvoter(self, voter):
+        vid = self.voters.get(voter)
+        if vid is None:
+            vid = self.voters[voter] = len(self.voters)
+            for cat in self.cats:
+                self.fc[cat].append(array('I'))
+        return vid
+
+    def internsubject(self, subject):
+        sid = self.subjects.get(subject)
+        if sid is None:
+            sid = self.subjects[subject] = len(self.subjects)
+        return sid
+
+    # Train on one roll call: votes are (voter, category) pairs, subjects the
+    # subjects of the bill. Every voter is counted once per subject
+    def trainrollcall(self, votes, subjects):
+        if not subjects: return
+        sids = [self.internsubject(subject) for subject in subjects]
+        size = len(self.subjects)
+
+        for voter, cat in votes:
+            vid = self.internvoter(voter)
+            if cat not in self.cc:
+                self.cats.append(cat)
+                self.cc[cat] = 0
+                self.fc[cat] = [array('I') for v in self.voters]
+            row = self.fc[cat][vid]
+            if len(row) < size:
+                row.extend([0]*(size - len(row)))
+            for sid in sids:
+                row[sid] += 1
+            self.cc[cat] += len(sids)
+            self.total += len(sids)
+
+        self.decisions.clear()
+
+    # Add counts made somewhere else (see countRollCalls): voters, subjects and
+    # cats name the ids counts refers to, and counts is a flat array of
+    # (voter, subject, cat, count) quadruples. cats are in the order they were
+    # first counted, so merging counts in file order gives the same model as
+    # training on the roll calls one by one
+    def traincounts(self, voters, subjects, cats, counts):
+        vids = [self.internvoter(voter) for voter in voters]
+        sids = [self.internsubject(subject) for subject in subjects]
+        size = len(self.subjects)
+        for cat in cats:
+            if cat not in self.cc:
+                self.cats.append(cat)
+                self.cc[cat] = 0
+                self.fc[cat] = [array('I') for v in self.voters]
+        columns = [self.fc[cat] for cat in cats]
+
+        for i in range(0, len(counts), 4):
+            voter, subject, cat, count = counts[i:i + 4]
+            row = columns[cat][vids[voter]]
+            if len(row) < size:
+                row.extend([0]*(size - len(row)))
+            row[sids[subject]] += count
+            self.cc[cats[cat]] += count
+            self.total += count
+
+        self.decisions.clear()
+
+    # The probabilities naivebayes.featureprobs would give a (voter, subject)
+    # feature with these counts in each of self.cats
+    def countprobs(self, counts):
+        totals = sum(counts)
+        probs = {}
+        for cat, count in zip(self.cats, counts):
+            basicprob = float(count)/float(self.cc[cat])
+            weighted = ((self.weight*self.ap)+(totals*basicprob))/(self.weight+totals)
+            catprob = float(self.cc[cat])/self.total
+            probs[cat] = 100.0 - ((-1*(1 + math.log(weighted))) * catprob)
+        return probs
+
+    def countdecision(self, counts):
+        decision = self.decisions.get(counts)
+        if decision is None and counts not in self.decisions:
+            decision = self.decisions[counts] = self.decide(self.countprobs(counts))
+        return decision
+
+    # The predicted category of every (voter, subject) pair of a roll call,
+    # voter by voter and subject by subject within each voter
+    def classifyrollcall(self, voters, subjects, default = None):
+        if not subjects or not self.cats: return [default]*(len(voters)*len(subjects))
+
+        # unseen subjects and voters read their counts out of an all-zero
+        # column/row one past the end
+        size = len(self.subjects)
+        sids = [self.subjects.get(subject, size) for subject in subjects]
+        pick = itemgetter(*sids) if len(sids) > 1 else (lambda row: (row[sids[0]],))
+        empty = array('I', [0])*(size + 1)
+
+        predictions = []
+        for voter in voters:
+            vid = self.voters.get(voter)
+            rows = []
+            for cat in self.cats:
+                row = self.fc[cat][vid] if vid is not None else empty
+                if len(row) <= size:
+                    row.extend([0]*(size + 1 - len(row)))
+                rows.append(pick(row))
+            predictions += map(self.countdecision, zip(*rows))
+        return predictions
+
+# The (voter id, category) votes and the bill subjects of a roll call, or None
+# if the roll call can't be read or its bill isn't in bills (see
+# helpers/bill_index.py). Voters without an id (the vice president's
+# tie-breaking vote is just "VP") end the votes, which is as far as the
+# per-pair training used to get with them
+def readRollCall(votePath, bills):
+    try:
+        with open(votePath) as vote_file:
+            vote_data = json.load(vote_file)
+
+        # the bill is looked up with the roll call's own number, which is the
+        # bill path these scripts have always read
+        subjects = bills[bill_key(
+            vote_data["bill"]["congress"],
+            vote_data["bill"]["type"],
+            vote_data["number"] )][0]
+        if subjects is None: return None
+
+        votes = []
+        for status in vote_data["votes"].keys():
+            for vote in vote_data["votes"][status]:
+                try:
+                    votes.append((vote["id"], group(status)))
+                except (TypeError, KeyError):
+                    return votes, subjects
+        return votes, subjects
+    # unreadable or malformed roll calls, and bills missing from the index
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def voteFiles(votePath):
+    paths = []
     for path, dirs, files in os.walk(votePath):
         for data_file in files:
             if ".json" in data_file:
-                parseFeatures(predictor, path + "/" + data_file)
+                paths.append(path + "/" + data_file)
+    return paths
+
+# The bill index each ingesting worker reads roll calls against, in ingestInit
+ingestBills = None
+
+def ingestInit(bills):
+    global ingestBills
+    ingestBills = bills
+
+# Reads a chunk of roll calls in a worker and returns their counts the way
+# voteclassifier.traincounts takes them, with voters, subjects and categories
+# numbered within the chunk
+def countRollCalls(paths):
+    voters, subjects, cats = {}, {}, {}
+    counts = {}
+    for path in paths:
+        rollCall = readRollCall(path, ingestBills)
+        if rollCall is None: continue
+        votes, billSubjects = rollCall
+        if not billSubjects: continue
+
+        sids = [subjects.setdefault(subject, len(subjects)) for subject in billSubjects]
+        for voter, cat in votes:
+            vid = voters.setdefault(voter, len(voters))
+            cid = cats.setdefault(cat, len(cats))
+            for sid in sids:
+                key = (vid, sid, cid)
+                counts[key] = counts.get(key, 0) + 1
+
+    flat = array('I')
+    for key, count in counts.items():
+        flat.extend(key)
+        flat.append(count)
+    return list(voters), list(subjects), list(cats), flat
+
+# Trains on every roll call under votePath. The roll calls are read and counted
+# by a pool of `processes` workers (all cores if None) in chunks of `chunk`
+# files, and the counts are merged into predictor in file order; processes=1
+# reads them in this process instead
+def trainPredictor(predictor, votePath = "data/votes_111", bills = None, processes = None, chunk = 64):
+    if bills is None: bills = bill_index()
+    paths = voteFiles(votePath)
+    fileCount = len(paths)
+
+    if processes == 1:
+        for i, rollCallPath in enumerate(paths, 1):
+            rollCall = readRollCall(rollCallPath, bills)
+            if rollCall is not None:
+                predictor.trainrollcall(*rollCall)
+
+            sys.stdout.flush()
+            sys.stdout.write("\rtrained with %d/%d files... " % (i, fileCount))
+        print ("finished %s" % votePath)
+        return
+
+    chunks = [paths[i:i + chunk] for i in range(0, len(paths), chunk)]
+    i = 0
+    with multiprocessing.Pool(processes, ingestInit, (bills,)) as pool:
+        for rollCalls, counts in zip(chunks, pool.imap(countRollCalls, chunks)):
+            predictor.traincounts(*counts)
 
-                i += 1
-                sys.stdout.flush()
-                sys.stdout.write("\rtrained with %d/%d files... " % (i, fileCount))
+            i += len(rollCalls)
+            sys.stdout.flush()
+            sys.stdout.write("\rtrained with %d/%d files... " % (i, fileCount))
     print ("finished %s" % votePath)
 
 def group(status):
     return 1 if (status == "Aye" or status == "Yea") else 0
 
-def predictOutcomes(predictor, votePath = "data/votes_113"):
+def predictOutcomes(predictor, votePath = "data/votes_113", bills = None):
+    if bills is None: bills = bill_index()
     accuracy = [0,0]
-    fileCount = 0
-    for path, dirs, files in os.walk(votePath):
-        for data_file in files:
-            fileCount += 1
-
-    i = 0
-    for path, dirs, files in os.walk(votePath):
-        for data_file in files:
-            if ".json" in data_file:
-                with open(path + "/" + data_file) as vote_file:
-                    i += 1
-                    vote_data = json.load(vote_file)
-
-                    try: 
-                        billPath = "data/bills_%d/%s/%s%d/data.json" % (
-                            vote_data["bill"]["congress"],
-                            vote_data["bill"]["type"],
-                            vote_data["bill"]["type"],
-                            vote_data["number"] )
-
-                        with open(billPath) as bill_file:
-                            bill_data = json.load(bill_file)
+    paths = voteFiles(votePath)
+    fileCount = len(paths)
 
-                        for status in vote_data["votes"].keys():
-                            for vote in vote_data["votes"][status]:
-                                for subject in bill_data["subjects"]:
-                                    # we are essentially how a particular voter has voted on each subject in the past
-                                    # print("here")
-                                    accuracy[0] += predictor.classify((vote, subject)) == group(status)
-                                    accuracy[1] += 1
+    for i, rollCallPath in enumerate(paths, 1):
+        rollCall = readRollCall(rollCallPath, bills)
+        if rollCall is not None:
+            votes, subjects = rollCall
+            predictions = predictor.classifyrollcall([voter for voter, cat in votes], subjects)
+            actual = [cat for voter, cat in votes for subject in subjects]
+            accuracy[0] += sum(1 for p, a in zip(predictions, actual) if p == a)
+            accuracy[1] += len(actual)
 
-                        bill_file.close()
-
-
-                    except:
-                        pass
-
-                    sys.stdout.flush()
-                    sys.stdout.write("\rclassified %d/%d files... " % (i, fileCount))
-
-                vote_file.close()
+        sys.stdout.flush()
+        sys.stdout.write("\rclassified %d/%d files... " % (i, fileCount))
 
     return accuracy
 
-vote_predictor = naivebayes(getVoteFeatures)
-trainPredictor(vote_predictor, "data/votes_111")
-trainPredictor(vote_predictor, "data/votes_112")
-predictions = predictOutcomes(vote_predictor, "data/votes_113")
-print("%.2f%% accuracy for %d votes" % (100*predictions[0]/predictions[1], predictions[1]) )
+def main():
+    bills = bill_index()
+    vote_predictor = voteclassifier()
+    trainPredictor(vote_predictor, "data/votes_111", bills)
+    trainPredictor(vote_predictor, "data/votes_112", bills)
+    predictions = predictOutcomes(vote_predictor, "data/votes_113", bills)
+    print("%.2f%% accuracy for %d votes" % (100*predictions[0]/predictions[1], predictions[1]) )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,618 @@
+import math, json, mmap, struct, sys, os, hashlib, inspect, multiprocessing
+from array import array
+
+# The naive bayes engine shared by the bill, distilled bill and vote predictors.
+#
+# A predictor is built around a feature extractor: a function that takes an item
+# (a bill path, a distilled row, a (vote, subject) pair...) and returns the
+# features for that item. Everything after feature extraction goes through
+# trainfeatures/featureprobs, so the scripts can also hand over features they
+# have already extracted instead of paying for the extraction twice.
+#
+# Features are interned to integer ids the first time they are seen, and the
+# counts are kept in array('I') columns indexed by id (one per category), so
+# a feature costs one dict entry plus four bytes per category instead of a
+# dict of counts of its own.
+#
+# Models are saved in a small binary format instead of pickles:
+#
+#   magic (8 bytes) | version (u32) | header length (u32) | JSON header
+#   padding to 8 bytes | ft column | one count column per category
+#
+# The header holds the categories, their counts, the thresholds and the
+# features in id order. The columns are raw uint32 arrays, so load() maps
+# the file and reads the counts straight out of the page cache; processes
+# loading the same model share those pages. The header also records what the
+# model was trained from (see cached), so stale models aren't reused.
+
+MAGIC = b"NBMODEL\0"
+VERSION = 1
+
+class classifier:
+    def __init__(self, getfeatures, filename=None):
+        # Integer id of every feature, and the features in id order
+        self.fids = {}
+        self.flist = []
+        # Counts of feature/category combinations, one column per category
+        self.fc = {}
+        # Counts of documents in each category
+        self.cc = {}
+        # Counts of each feature across all categories
+        self.ft = array('I')
+        # Total number of items across all categories
+        self.total = 0
+        # Memoized weightedprob values, only valid until the counts change
+        self.cache = {}
+        self.getfeatures = getfeatures
+
+    # The memoized probabilities are cheap to rebuild, so they aren't saved
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["cache"] = {}
+        return state
+
+    # Predictors saved with a dict of counts per feature get their counts interned
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "fids" not in state:
+            counts = self.fc
+            self.fids = {}
+            self.flist = []
+            self.fc = {cat: array('I') for cat in self.cc}
+            self.ft = array('I')
+            self.total = sum(self.cc.values())
+            self.cache = {}
+            for f in counts:
+                fid = self.intern(f)
+                for cat in counts[f]:
+                    self.fc[cat][fid] = counts[f][cat]
+                    self.ft[fid] += counts[f][cat]
+
+    # Give a feature the next integer id, with a zero count in every column
+    def intern(self,f):
+        fid = len(self.flist)
+        self.fids[f] = fid
+        self.flist.append(f)
+        self.ft.append(0)
+        for column in self.fc.values():
+            column.append(0)
+        return fid
+
+    # Increase the count of a feature/category pair
+    def incf(self,f,cat,count=1):
+        fid = self.fids.get(f)
+        if fid is None: fid = self.intern(f)
+        if cat not in self.fc: self.fc[cat] = array('I', [0])*len(self.flist)
+        self.fc[cat][fid]+=count
+        self.ft[fid]+=count
+        self.cache.clear()
+
+    # Increase the count of a category. A category whose count drops to
+    # zero is removed, as if it had never been trained on
+    def incc(self,cat,count=1):
+        self.cc.setdefault(cat,0)
+        self.cc[cat]+=count
+        self.total+=count
+        if self.cc[cat]==0: del self.cc[cat]
+        self.cache.clear()
+
+    # The number of times a feature has appeared in a category
+    def fcount(self,f,cat):
+        fid = self.fids.get(f)
+        if fid is not None and cat in self.fc:
+            return float(self.fc[cat][fid])
+        return 0.0
+
+    # The number of items in a category
+    def catcount(self,cat):
+        if cat in self.cc:
+            return float(self.cc[cat])
+        return 0
+
+    # The total number of items
+    def totalcount(self):
+        return self.total
+
+    # The list of all categories
+    def categories(self):
+        return self.cc.keys()
+
+    def train(self,item,cat):
+        self.trainfeatures(self.getfeatures(item),cat)
+
+    # Train on features that have already been extracted from an item
+    def trainfeatures(self,features,cat):
+        # Increment the count for every feature with this category
+        for f in features:
+            self.incf(f,cat)
+
+        # Increment the count for this category
+        self.incc(cat)
+
+    # Take back an item that was trained on before
+    def forgetfeatures(self,features,cat):
+        if self.catcount(cat)<1:
+            raise ValueError("no items were trained on in category %r" % (cat,))
+        for f in features:
+            if self.fcount(f,cat)<1:
+                raise ValueError("%r was never trained on in category %r" % (f,cat))
+
+        for f in features:
+            self.incf(f,cat,-1)
+        self.incc(cat,-1)
+
+    # Add counts that were aggregated somewhere else, e.g. by a database query:
+    # fcounts holds (feature, category, count) and ccounts (category, count)
+    def traincounts(self,fcounts,ccounts):
+        for f,cat,count in fcounts:
+            self.incf(f,cat,count)
+        for cat,count in ccounts:
+            self.incc(cat,count)
+
+    # Add the counts of another classifier to this one. Features new to this
+    # classifier are interned in the other's order, so merging shards trained
+    # on consecutive slices of the data gives the same ids as training on it all
+    def merge(self,other):
+        ids = []
+        for f in other.flist:
+            fid = self.fids.get(f)
+            if fid is None: fid = self.intern(f)
+            ids.append(fid)
+
+        for fid,count in zip(ids,other.ft):
+            self.ft[fid] += count
+        for cat in other.cc:
+            self.cc[cat] = self.cc.get(cat,0) + other.cc[cat]
+            if cat not in self.fc: self.fc[cat] = array('I', [0])*len(self.flist)
+            column = self.fc[cat]
+            for fid,count in zip(ids,other.fc.get(cat,())):
+                if count: column[fid] += count
+        self.total += other.total
+        self.cache.clear()
+
+    def fprob(self,f,cat):
+        if self.catcount(cat)==0: return 0
+
+        # The total number of times this feature appeared in this
+        # category divided by the total number of items in this category
+        return self.fcount(f,cat)/self.catcount(cat)
+
+    def weightedprob(self,f,cat,prf,weight=1.0,ap=0.5):
+        key=(f,cat,prf,weight,ap)
+        if key in self.cache: return self.cache[key]
+
+        # Calculate current probability
+        basicprob=prf(f,cat)
+
+        # Count the number of times this feature has appeared in
+        # all categories
+        fid=self.fids.get(f)
+        totals=self.ft[fid] if fid is not None else 0
+
+        # Calculate the weighted average
+        bp=((weight*ap)+(totals*basicprob))/(weight+totals)
+        self.cache[key]=bp
+        return bp
+
+class naivebayes(classifier):
+    # flip makes a two-category model answer with the category it didn't pick,
+    # which is how the bill predictors have always reported their outcomes.
+    # weight and ap are the smoothing passed to weightedprob
+    def __init__(self,getfeatures,flip=False,weight=1.0,ap=0.5):
+        classifier.__init__(self, getfeatures)
+        self.thresholds={}
+        self.flip=flip
+        self.weight=weight
+        self.ap=ap
+        # The stamp of every input this model has been trained on, and what
+        # extracted its features (see extractorid), for the header
+        self.inputs=[]
+        self.extractor=None
+        self.compiled=False
+
+    def checkwritable(self):
+        if isinstance(self.ft, memoryview):
+            raise TypeError("this model is mapped read-only, load it with writable=True to train it")
+
+    def trainfeatures(self,features,cat):
+        self.checkwritable()
+        # Any compiled tables are stale as soon as the counts change
+        self.compiled=False
+        classifier.trainfeatures(self,features,cat)
+
+    def traincounts(self,fcounts,ccounts):
+        self.checkwritable()
+        self.compiled=False
+        classifier.traincounts(self,fcounts,ccounts)
+
+    def forgetfeatures(self,features,cat):
+        self.checkwritable()
+        self.compiled=False
+        classifier.forgetfeatures(self,features,cat)
+
+    def merge(self,other):
+        self.checkwritable()
+        self.compiled=False
+        classifier.merge(self,other)
+
+    # Train on (item, category) rows, and take back rows trained on before.
+    # A compiled table is rebuilt afterwards: every row of it depends on the
+    # category counts, but rebuilding it only costs one pass over the features
+    def update(self,rows):
+        compiled = self.compiled
+        for item,cat in rows:
+            self.train(item,cat)
+        if compiled: self.compile()
+
+    def forget(self,rows):
+        compiled = self.compiled
+        for item,cat in rows:
+            self.forgetfeatures(self.getfeatures(item),cat)
+        if compiled: self.compile()
+
+    def docprob(self,item,cat):
+        return self.featuredocprob(self.getfeatures(item),cat)
+
+    def featuredocprob(self,features,cat):
+        # Multiply the probabilities of all the features together
+        p = 1
+        for f in features: p += math.log(self.weightedprob(f,cat,self.fprob,self.weight,self.ap))
+        return -1*p
+
+    def prob(self,item,cat):
+        return self.featureprob(self.getfeatures(item),cat)
+
+    def featureprob(self,features,cat):
+        catprob = self.catcount(cat)/self.totalcount()
+        docprob = self.featuredocprob(features,cat)
+        return 100.0 - (docprob * catprob)
+
+    # Freeze fc/cc into a dense (features x categories) table of
+    # log(weightedprob) indexed by feature id, so scoring an item is a
+    # handful of row lookups
+    def compile(self):
+        self.cats = list(self.categories())
+        self.logprobs = []
+        for f in self.flist:
+            self.logprobs.append([math.log(self.weightedprob(f,cat,self.fprob,self.weight,self.ap)) for cat in self.cats])
+
+        # Features never seen in training all share the assumed probability,
+        # which lives in the last row of the table
+        self.unseen = len(self.logprobs)
+        self.logprobs.append([math.log(self.weightedprob(None,cat,self.fprob,self.weight,self.ap)) for cat in self.cats])
+
+        self.catprobs = [self.catcount(cat)/self.totalcount() for cat in self.cats]
+        self.compiled = True
+
+    # The featureprob of every category for one item's features. Once compiled
+    # the numbers are read off the table, adding the log terms in the same
+    # order as featuredocprob so the results are identical
+    def featureprobs(self,features):
+        probs = {}
+        if not self.compiled:
+            for cat in self.categories():
+                probs[cat] = self.featureprob(features,cat)
+            return probs
+
+        rows = [self.logprobs[self.fids.get(f,self.unseen)] for f in features]
+        if rows:
+            sums = [sum(column,1) for column in zip(*rows)]
+        else:
+            sums = [1]*len(self.cats)
+
+        for i,cat in enumerate(self.cats):
+            probs[cat] = 100.0 - ((-1*sums[i]) * self.catprobs[i])
+        return probs
+
+    # Score a whole batch of items against the compiled table
+    def batchprobs(self,items):
+        if not self.compiled: self.compile()
+        return [self.featureprobs(self.getfeatures(item)) for item in items]
+
+    def batchclassify(self,items,default = None):
+        return [self.decide(probs,default) for probs in self.batchprobs(items)]
+
+    def setthreshold(self,cat,t):
+        self.thresholds[cat]=t
+
+    def getthreshold(self,cat):
+        if cat not in self.thresholds: return 1.0
+        return self.thresholds[cat]
+
+    def classify(self,item,default = None):
+        return self.decide(self.featureprobs(self.getfeatures(item)),default)
+
+    def classifyfeatures(self,features,default = None):
+        return self.decide(self.featureprobs(features),default)
+
+    # Pick the category with the highest probability. Items where no category
+    # comes out positive get default: the distilled copy used to skip those
+    # bills and the vote copy gave up on the rest of the roll call, rather
+    # than answering for a category that wasn't picked
+    def decide(self,probs,default = None):
+        # Find the category with the highest probability
+
+        max = 0.0
+        best = None
+        for cat in probs:
+          if probs[cat] > max:
+            max = probs[cat]
+            best = cat
+        if best is None: return default
+        for cat in probs:
+          if cat==best: continue
+          if probs[cat]*self.getthreshold(best)>probs[best]: return default
+        return 1 - best if self.flip else best
+
+    # Write the counts in the binary model format described at the top of this file.
+    # The feature extractor isn't saved, it is passed back in to load(). The
+    # model is written next to path and moved over it, so processes that have
+    # the old one mapped keep it and an interrupted save leaves it as it was
+    def save(self,path):
+        header = self.header()
+        with open(path + ".tmp", "wb") as model_file:
+            model_file.write(struct.pack("<8sII", MAGIC, VERSION, len(header)))
+            model_file.write(header)
+            model_file.write(b"\0" * (-(16 + len(header)) % 8))
+            model_file.write(self.ft)
+            for cat in self.cc:
+                model_file.write(self.fc.get(cat, array('I', [0])*len(self.flist)))
+        os.replace(path + ".tmp", path)
+
+    def header(self):
+        return json.dumps({
+            "byteorder": sys.byteorder,
+            "categories": list(self.cc.keys()),
+            "catcounts": list(self.cc.values()),
+            "thresholds": list(self.thresholds.items()),
+            "flip": self.flip,
+            "weight": self.weight,
+            "ap": self.ap,
+            "extractor": self.extractor or extractorid(self.getfeatures),
+            "inputs": self.inputs,
+            "features": self.flist,
+        }).encode("utf-8")
+
+# Train a fresh classifier on one shard of the training data, in a worker process
+def trainshard(job):
+    getfeatures, train, shard = job
+    predictor = classifier(getfeatures)
+    train(predictor, shard)
+    return predictor
+
+# Train predictor on every shard, spread over a pool of processes (all cores by
+# default). train(predictor, shard) trains on one shard; each worker fills its
+# own count table and the tables are merged back in shard order, which makes
+# the result the same as training on the shards one after the other.
+# done(count) is called as each shard is merged
+def trainparallel(predictor, shards, train, processes=None, done=None):
+    predictor.checkwritable()
+    jobs = [(predictor.getfeatures, train, shard) for shard in shards]
+    with multiprocessing.Pool(processes) as pool:
+        for count, shard in enumerate(pool.imap(trainshard, jobs), 1):
+            predictor.merge(shard)
+            if done: done(count)
+
+# The model each classifying worker maps once, in classifyinit
+worker = None
+
+def classifyinit(path, getfeatures):
+    global worker
+    worker = load(path, getfeatures)
+    worker.compile()
+
+def classifyshard(job):
+    extract, finish, shard = job
+    results = []
+    for item in shard:
+        features, actual = extract(item)
+        results.append((worker.classifyfeatures(features), actual))
+    if finish: finish()
+    return results
+
+# Classify items in a pool of processes (all cores by default) that each map
+# the model saved at path, so they share its pages. extract(item) returns the
+# item's features and its actual category, and is the only place an item is
+# read. finish(), if given, is called in the worker after each chunk of items.
+# Returns (predicted, actual) pairs in item order; done(count) is called
+# with the number of items classified so far
+def classifyparallel(path, getfeatures, items, extract, processes=None, chunk=256, done=None, finish=None):
+    jobs = [(extract, finish, items[i:i + chunk]) for i in range(0, len(items), chunk)]
+    results = []
+    with multiprocessing.Pool(processes, classifyinit, (path, getfeatures)) as pool:
+        for shard in pool.imap(classifyshard, jobs):
+            results += shard
+            if done: done(len(results))
+    return results
+
+# Load a model written by naivebayes.save. The count columns are views of the
+# mapped file, so the model is read-only unless writable is set, in which case
+# the columns are copied into arrays that training can extend
+def load(path, getfeatures, writable=False):
+    with open(path, "rb") as model_file:
+        mapped = mmap.mmap(model_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped) < 16:
+        raise ValueError("%s is not a saved model" % path)
+    magic, version, length = struct.unpack_from("<8sII", mapped)
+    if magic != MAGIC:
+        raise ValueError("%s is not a saved model" % path)
+    if version != VERSION:
+        raise ValueError("%s is a version %d model, expected version %d" % (path, version, VERSION))
+
+    header = json.loads(mapped[16:16 + length].decode("utf-8"))
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError("%s was saved on a %s-endian machine" % (path, header["byteorder"]))
+
+    predictor = naivebayes(getfeatures, flip=header["flip"],
+                           weight=header.get("weight", 1.0), ap=header.get("ap", 0.5))
+    predictor.extractor = header.get("extractor")
+    predictor.inputs = header.get("inputs", [])
+    # JSON has no tuples, so features like (voter, subject) come back as lists
+    predictor.flist = [tuple(f) if isinstance(f, list) else f for f in header["features"]]
+    predictor.fids = {f: fid for fid, f in enumerate(predictor.flist)}
+    predictor.thresholds = {cat: t for cat, t in header["thresholds"]}
+
+    size = 4 * len(predictor.flist)
+    offset = 16 + length + (-(16 + length) % 8)
+    if len(mapped) != offset + (len(header["categories"]) + 1) * size:
+        raise ValueError("%s is truncated or has trailing bytes" % path)
+    columns = []
+    view = memoryview(mapped)
+    for i in range(len(header["categories"]) + 1):
+        column = view[offset:offset + size].cast("I")
+        columns.append(array('I', bytes(column)) if writable else column)
+        offset += size
+
+    predictor.ft = columns[0]
+    for cat, count, column in zip(header["categories"], header["catcounts"], columns[1:]):
+        predictor.cc[cat] = count
+        predictor.fc[cat] = column
+    predictor.total = sum(predictor.cc.values())
+    return predictor
+
+# Add and take back (item, category) rows in the model saved at path, e.g. to
+# move a window of congresses along. Only the rows in the delta are processed.
+# If they bring no new features or categories (and the header keeps its
+# length), just the changed counts are written into the file; otherwise the
+# model is saved again. inputs, if given, replaces the model's input stamps.
+# Returns the updated predictor
+def applydelta(path, getfeatures, added=(), dropped=(), inputs=None):
+    predictor = load(path, getfeatures, writable=True)
+    features = len(predictor.flist)
+    cats = list(predictor.cc)
+    with open(path, "rb") as model_file:
+        length = struct.unpack("<8sII", model_file.read(16))[2]
+
+    touched = set()
+    for item,cat in dropped:
+        itemfeatures = predictor.getfeatures(item)
+        predictor.forgetfeatures(itemfeatures,cat)
+        touched.update(itemfeatures)
+    for item,cat in added:
+        itemfeatures = predictor.getfeatures(item)
+        predictor.trainfeatures(itemfeatures,cat)
+        touched.update(itemfeatures)
+    if inputs is not None:
+        predictor.inputs = inputs
+
+    header = predictor.header()
+    if len(predictor.flist) != features or list(predictor.cc) != cats or len(header) != length:
+        predictor.save(path)
+        return predictor
+
+    base = 16 + length + (-(16 + length) % 8)
+    size = 4 * features
+    with open(path, "r+b") as model_file:
+        mapped = mmap.mmap(model_file.fileno(), 0)
+        mapped[16:16 + length] = header
+        for f in touched:
+            fid = predictor.fids[f]
+            struct.pack_into("I", mapped, base + 4 * fid, predictor.ft[fid])
+            for column,cat in enumerate(cats, 1):
+                count = predictor.fc[cat][fid] if cat in predictor.fc else 0
+                struct.pack_into("I", mapped, base + column * size + 4 * fid, count)
+        mapped.flush()
+        mapped.close()
+    return predictor
+
+# The functions and classes of this repository (other than this engine) that fn
+# calls by name, directly or through the functions and classes it reaches, in
+# the order they are found. Objects of a repository class reach their class
+def reachable(fn, found=None):
+    if found is None: found = []
+    fn = inspect.unwrap(fn)
+    if any(fn is seen for seen in found): return found
+    found.append(fn)
+
+    if inspect.isclass(fn):
+        for member in vars(fn).values():
+            if inspect.isfunction(member):
+                reachable(member, found)
+        return found
+
+    code = getattr(fn, "__code__", None)
+    if code is None: return found
+    codes = [code]
+    for code in codes:
+        codes += [const for const in code.co_consts if inspect.iscode(const)]
+        for name in code.co_names:
+            if name not in fn.__globals__: continue
+            target = inspect.unwrap(fn.__globals__[name])
+            if not (inspect.isfunction(target) or inspect.isclass(target)):
+                target = type(target)
+            if inrepository(target):
+                reachable(target, found)
+    return found
+
+# whether fn was defined in a module of this repository other than this one
+def inrepository(fn):
+    module = sys.modules.get(getattr(fn, "__module__", None))
+    path = getattr(module, "__file__", None)
+    if path is None or module is sys.modules[__name__]: return False
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.abspath(path).startswith(root + os.sep)
+
+# Identifies feature extraction by the names of the given functions (the
+# feature extractor, and for cached the function that reads the inputs) and the
+# source of everything they reach, so editing any of it, e.g. the bill parser
+# behind a one-line extractor, invalidates saved models
+def extractorid(*functions):
+    found = []
+    for fn in functions:
+        reachable(fn, found)
+
+    digest = hashlib.sha1()
+    for fn in found:
+        try:
+            digest.update(inspect.getsource(fn).encode("utf-8"))
+        except (OSError, TypeError):
+            digest.update(fn.__qualname__.encode("utf-8"))
+    return "%s:%s" % ("+".join(inspect.unwrap(fn).__qualname__ for fn in functions), digest.hexdigest())
+
+# The size and modification time of an input file, or for a directory the
+# number of files, their total size and the newest modification time
+def stamp(path):
+    if not os.path.isdir(path):
+        info = os.stat(path)
+        return [path, info.st_size, info.st_mtime_ns]
+
+    count, size, newest = 0, 0, 0
+    for dirpath, dirs, files in os.walk(path):
+        for name in files:
+            info = os.stat(os.path.join(dirpath, name))
+            count += 1
+            size += info.st_size
+            newest = max(newest, info.st_mtime_ns)
+    return [path, count, size, newest]
+
+# Reuse the model saved at path if it was built by the same feature extractor
+# and input reader (train) and options from inputs that haven't changed since. Inputs that are new since
+# it was saved are trained on top of it; if any input it was trained on has
+# changed or gone, it is retrained from scratch. train(predictor, input) trains
+# on one input. Returns the predictor and the inputs that had to be trained on
+def cached(path, getfeatures, inputs, train, **options):
+    predictor = naivebayes(getfeatures, **options)
+    predictor.extractor = extractorid(getfeatures, train)
+    stamps = {input: stamp(input) for input in inputs}
+
+    if os.path.isfile(path):
+        try:
+            saved = load(path, getfeatures, writable=True)
+        except ValueError:
+            saved = None
+
+        if (saved is not None and saved.extractor == predictor.extractor
+                and (saved.flip, saved.weight, saved.ap) == (predictor.flip, predictor.weight, predictor.ap)
+                and all(trained[0] in stamps and stamps[trained[0]] == trained for trained in saved.inputs)):
+            predictor = saved
+
+    seen = [trained[0] for trained in predictor.inputs]
+    stale = [input for input in inputs if input not in seen]
+    for input in stale:
+        train(predictor, input)
+        predictor.inputs.append(stamps[input])
+
+    if stale:
+        predictor.save(path)
+    return predictor, stale
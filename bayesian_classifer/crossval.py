@@ -0,0 +1,223 @@
+import math, sys, time
+from array import array
+from operator import itemgetter
+
+from classifier import naivebayes
+from bayes_bills_distilled import get_features, read_distilled, distilled_input, predict_file, accuracy
+
+# Cross-validation and hyperparameter sweeps for the naive bayes engine.
+#
+# Trying another weight, ap or threshold used to mean retraining a model for
+# every fold and every value. crossvalidation counts the rows once: the counts
+# of every fold are kept next to the totals, and the training counts for a fold
+# are the totals minus that fold's counts. The smoothing only changes the
+# log(weightedprob) table built from those counts, so a (weight, ap) pair costs
+# one table per fold and one pass adding up the held-out rows' log terms, and
+# every threshold is then decided from the same scores.
+#
+# That pass still visits every held-out row in Python, so only the thresholds
+# are free. On the bundled 111th and 112th congresses a (weight, ap) pair
+# takes about 70ms against about 0.3s for retraining and scoring both folds,
+# and main()'s grid of 378 configurations (54 pairs) about 3.5s, where
+# retraining for each would take about two minutes. Grouping identical rows
+# wouldn't help much: 80-90% of the rows of a fold are distinct.
+#
+# The numbers are computed exactly the way naivebayes.compile/featureprobs/decide
+# compute them, so the accuracy of a configuration is the accuracy a model
+# trained with it on the other folds would get.
+
+class crossvalidation:
+    # rows are (features, category) pairs, folds the fold each row is held out
+    # in (an index for k-fold, or e.g. the congress it came from). flip is the
+    # naivebayes option of the same name
+    def __init__(self, rows, folds, flip=False):
+        self.flip = flip
+        fids = {}
+        docs = []
+        for features, cat in rows:
+            ids = array('I')
+            for f in features:
+                fid = fids.get(f)
+                if fid is None:
+                    fid = fids[f] = len(fids)
+                ids.append(fid)
+            docs.append((ids, cat))
+        self.size = len(fids)
+
+        # the first two rows of every category in different folds, so the
+        # categories of a fold's training set can be put in the order a model
+        # trained on it would have them in
+        firsts = {}
+        fc = {}
+        cc = {}
+        foldfc = {}
+        foldcc = {}
+        heldout = {}
+        for i, ((ids, cat), fold) in enumerate(zip(docs, folds)):
+            seen = firsts.setdefault(cat, [])
+            if len(seen) < 2 and all(folds_of != fold for folds_of, row in seen):
+                seen.append((fold, i))
+
+            if cat not in fc: fc[cat] = array('I', [0])*self.size
+            column = fc[cat]
+            for fid in ids: column[fid] += 1
+            cc[cat] = cc.get(cat, 0) + 1
+
+            if fold not in foldfc:
+                foldfc[fold] = {}
+                foldcc[fold] = {}
+                heldout[fold] = []
+            if cat not in foldfc[fold]: foldfc[fold][cat] = array('I', [0])*self.size
+            column = foldfc[fold][cat]
+            for fid in ids: column[fid] += 1
+            foldcc[fold][cat] = foldcc[fold][cat] + 1 if cat in foldcc[fold] else 1
+            heldout[fold].append((ids, cat))
+
+        # the training counts of every fold, as the fprob of every feature in
+        # every category and the number of times each feature was seen
+        self.folds = []
+        for fold in foldfc:
+            order = []
+            for cat in firsts:
+                if cc[cat] > foldcc[fold].get(cat, 0):
+                    order.append(min(row for folds_of, row in firsts[cat] if folds_of != fold))
+            cats = [docs[row][1] for row in sorted(order)]
+
+            basic = []
+            ft = array('I', [0])*self.size
+            for cat in cats:
+                column = array('I', fc[cat])
+                if cat in foldfc[fold]:
+                    for fid, count in enumerate(foldfc[fold][cat]):
+                        if count: column[fid] -= count
+                for fid, count in enumerate(column):
+                    if count: ft[fid] += count
+                catcount = float(cc[cat] - foldcc[fold].get(cat, 0))
+                basic.append([float(count)/catcount for count in column])
+
+            total = sum(cc.values()) - sum(foldcc[fold].values())
+            catprobs = [float(cc[cat] - foldcc[fold].get(cat, 0))/total for cat in cats]
+
+            # an itemgetter per held-out row picks its features' log terms out of
+            # a table column in one call. rows with fewer than two features are
+            # padded with the id one past the end, whose log term is 0.0, so
+            # every getter returns a tuple and the sums don't change
+            getters = [itemgetter(*(ids if len(ids) > 1 else list(ids) + [self.size]*(2 - len(ids))))
+                       for ids, cat in heldout[fold]]
+            actual = [cat for ids, cat in heldout[fold]]
+            self.folds.append((fold, cats, basic, ft, catprobs, getters, actual))
+
+    # The featureprobs of every held-out row, with the table a model trained on
+    # the rest of its fold would compile for weight and ap. Yields, per fold,
+    # the fold's categories, the probabilities of each category for all its
+    # rows, and the rows' actual categories
+    def scores(self, weight=1.0, ap=0.5):
+        wa = weight*ap
+        for fold, cats, basic, ft, catprobs, getters, actual in self.folds:
+            columns = []
+            for column, catprob in zip(basic, catprobs):
+                logprobs = [math.log((wa+(totals*bp))/(weight+totals)) for totals, bp in zip(ft, column)]
+                logprobs.append(0.0)
+                columns.append([100.0 - ((-1*sum(getter(logprobs), 1)) * catprob) for getter in getters])
+            yield cats, columns, actual
+
+    # The number of rows each threshold gets right, deciding like
+    # naivebayes.decide with the threshold set for every category and no
+    # default. thresholds can't be negative
+    def correct(self, scored, thresholds):
+        # (probability of the best category, highest probability of the others)
+        # for every row the best category is right for; with a threshold of t
+        # the row is decided iff other*t <= best
+        decided = []
+        alone = 0
+        for cats, columns, actual in scored:
+            # the answer decide gives when each category comes out best
+            answers = [1 - cat if self.flip else cat for cat in cats]
+            for probs, result in zip(zip(*columns), actual):
+                # decide picks the first category with the highest probability,
+                # and leaves the row undecided if none of them is positive
+                top = max(probs)
+                if top <= 0.0: continue
+                i = probs.index(top)
+                if answers[i] != result: continue
+
+                if len(probs) == 2:
+                    decided.append((probs[i], probs[1 - i]))
+                elif len(probs) == 1:
+                    alone += 1
+                else:
+                    decided.append((probs[i], max(probs[:i] + probs[i+1:])))
+
+        counts = []
+        for t in thresholds:
+            if t < 0: raise ValueError("thresholds can't be negative, got %r" % (t,))
+            counts.append(alone + len([best for best, other in decided if other*t <= best]))
+        return counts
+
+    # The accuracy of every combination of weights, aps and thresholds, best
+    # first, as (accuracy, weight, ap, threshold)
+    def sweep(self, weights=(1.0,), aps=(0.5,), thresholds=(1.0,)):
+        rows = sum(len(fold[6]) for fold in self.folds)
+        results = []
+        for weight in weights:
+            for ap in aps:
+                counts = self.correct(self.scores(weight, ap), thresholds)
+                for t, count in zip(thresholds, counts):
+                    results.append((float(count)/rows, weight, ap, t))
+        results.sort(key=lambda result: -result[0])
+        return results
+
+# (features, result) rows of distilled files, and the file each row came from
+def distilled_rows(paths):
+    rows = []
+    folds = []
+    for path in paths:
+        for data, result in read_distilled(path):
+            rows.append((get_features(data), result))
+            folds.append(path)
+    return rows, folds
+
+def main():
+    # holds out one congress at a time by default, or with a number k, splits
+    # the bills of both congresses into k folds
+    paths = [distilled_input("data_distilled/data_distilled_111.csv"),
+             distilled_input("data_distilled/data_distilled_112.csv")]
+    rows, folds = distilled_rows(paths)
+    if len(sys.argv) > 1:
+        k = int(sys.argv[1])
+        folds = [i % k for i in range(len(rows))]
+        print("%d-fold cross-validation over %d bills" % (k, len(rows)))
+    else:
+        print("Holding out one congress at a time over %d bills" % len(rows))
+
+    weights = [0.25, 0.5, 1.0, 2.0, 4.0, 8.0]
+    aps = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+    thresholds = [1.0, 1.001, 1.002, 1.005, 1.01, 1.02, 1.05]
+
+    start = time.time()
+    results = crossvalidation(rows, folds, flip=True).sweep(weights, aps, thresholds)
+    swept = time.time() - start
+    print("Swept %d configurations in %.2f seconds\n" % (len(results), swept))
+
+    print("accuracy    weight  ap    threshold")
+    for result in results[:10]:
+        print("%.5f%%  %-7g %-5g %g" % (100*result[0], result[1], result[2], result[3]))
+    default = [result for result in results if result[1:] == (1.0, 0.5, 1.0)][0]
+    print("%.5f%%  %-7g %-5g %g  (default)" % (100*default[0], 1.0, 0.5, 1.0))
+
+    # one retrain with the best configuration, tested on the 113th congress
+    accuracy_best, weight, ap, t = results[0]
+    start = time.time()
+    predictor = naivebayes(get_features, flip=True, weight=weight, ap=ap)
+    for path in paths:
+        for data, result in read_distilled(path):
+            predictor.train(data, result)
+    for cat in predictor.categories():
+        predictor.setthreshold(cat, t)
+    predictor.compile()
+    outcomes = accuracy(*predict_file(predictor, distilled_input("data_distilled/data_distilled_113.csv")))
+    print("\nTrained and tested on the 113th congress in %.2f seconds" % (time.time() - start))
+    print("Accuracy --> %.5f%% for %d bills" % (100*outcomes[0]/outcomes[1], outcomes[1]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from array import array
+from itertools import accumulate, groupby
+
+# Evaluation of a binary predictor from one array of per-bill scores.
+#
+# A score is higher the more the predictor leans towards the positive answer
+# (see bayes_bills_distilled.enacted_scores). Everything here comes from
+# sorting the bills by score once: predicting "positive" for every bill
+# scoring at least s gives, for each distinct s, the running totals of
+# positives and negatives above the cut, and the ROC curve, precision/recall
+# and the cut-off table are all read off those totals. Trying another cut-off
+# never re-classifies anything.
+#
+# A cut-off here is a plain score cut-off: every bill below it counts as
+# predicted negative. It is not a naivebayes.setthreshold value: decide only
+# consults the threshold of the category that is already best, so thresholds
+# below 1 change nothing, and a threshold that blocks leaves the bill
+# undecided rather than giving it the other category.
+
+# The distinct scores from the highest down, with the number of positive and
+# negative bills scoring at least that much, as three parallel arrays
+def cutoffs(scores, actual):
+    order = sorted(range(len(scores)), key = scores.__getitem__, reverse = True)
+    thresholds = array('d')
+    counts = []
+    for score, group in groupby(order, key = scores.__getitem__):
+        group = list(group)
+        positives = sum(1 for i in group if actual[i])
+        thresholds.append(score)
+        counts.append((positives, len(group) - positives))
+
+    tps = array('l', accumulate(positives for positives, negatives in counts))
+    fps = array('l', accumulate(negatives for positives, negatives in counts))
+    return thresholds, tps, fps
+
+# The area under the ROC curve, with tied scores counted as half right
+def roc_auc(scores, actual):
+    thresholds, tps, fps = cutoffs(scores, actual)
+    if not tps or not tps[-1] or not fps[-1]:
+        return float("nan")
+
+    area = 0.0
+    tp = fp = 0
+    for next_tp, next_fp in zip(tps, fps):
+        area += (next_fp - fp) * (tp + next_tp) / 2.0
+        tp, fp = next_tp, next_fp
+    return area / (tps[-1] * fps[-1])
+
+# One row per distinct score s for predicting positive iff score >= s, and
+# negative otherwise:
+# (s, tp, fp, fn, tn, precision, recall, f1, accuracy)
+def threshold_table(scores, actual):
+    thresholds, tps, fps = cutoffs(scores, actual)
+    positives = tps[-1] if tps else 0
+    negatives = fps[-1] if fps else 0
+    table = []
+    for s, tp, fp in zip(thresholds, tps, fps):
+        fn = positives - tp
+        tn = negatives - fp
+        precision = float(tp) / (tp + fp) if tp + fp else 0.0
+        recall = float(tp) / positives if positives else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        table.append((s, tp, fp, fn, tn, precision, recall, f1, float(tp + tn) / len(scores)))
+    return table
+
+# The `count` rows of a cut-off table with the highest value in `column`
+# (7 is F1, 8 accuracy)
+def best_thresholds(table, column = 7, count = 5):
+    return sorted(table, key = lambda row: -row[column])[:count]
+
+# Splits the bills into `bins` equal groups by score, lowest first, and
+# returns (lowest score, highest score, bills, rate of positives) for each,
+# which shows whether a higher score really means a likelier positive
+def calibration(scores, actual, bins = 10):
+    order = sorted(range(len(scores)), key = scores.__getitem__)
+    curve = []
+    for b in range(bins):
+        group = order[len(order) * b // bins:len(order) * (b + 1) // bins]
+        if not group: continue
+        positives = sum(1 for i in group if actual[i])
+        curve.append((scores[group[0]], scores[group[-1]], len(group), float(positives) / len(group)))
+    return curve
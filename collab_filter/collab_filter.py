@@ -1,6 +1,7 @@
 from copy import deepcopy
 from pprint import pprint
 from math import sqrt
+import heapq, random
 # import multiprocessing
 
 '''
@@ -15,12 +16,15 @@ from math import sqrt
 def sim_distance( prefs, person1, person2 ):
 def sim_pearson( prefs, p1, p2 ):
 
-def topMatches( prefs, person, n=5, similarity=sim_pearson ):
-def getRecommendations( prefs, person, similarity=sim_pearson ):
+class LSHIndex( prefs, tables=16, bits=6, probes=0, seed=0 ):
+    def candidates( self, vector ):
+
+def topMatches( prefs, person, n=5, similarity=sim_pearson, index=None ):
+def getRecommendations( prefs, person, similarity=sim_pearson, index=None ):
 
 def transformPrefs( prefs ):
 
-def calculateSimilarItems( prefs, n=10 ):
+def calculateSimilarItems( prefs, n=10, similarity=sim_pearson ):
 def getRecommendedItems( prefs, itemMatch, user ):
 
 def loadMovieLens_data( path='./ml-100k' ):
@@ -96,29 +100,97 @@ def sim_pearson(prefs, p1, p2 ):
 
   return r
 
+###########################################################################
+# LSHIndex
+###########################################################################
+
+# An approximate nearest neighbour index over the preference vectors in
+# prefs, built once, so topMatches and getRecommendations can score a few
+# candidates instead of everybody.
+#
+# It is random-projection LSH: each of `tables` hash tables draws `bits`
+# random hyperplanes (a gaussian weight per item), and files every person
+# under the side of each plane their vector falls on. Vectors are centred on
+# their mean first, so people whose ratings go up and down together, which is
+# what sim_pearson measures, tend to land in the same buckets. The candidates
+# for a vector are the people in its bucket in any table, plus with probes=1
+# the buckets one bit away. More tables or probes raise recall, more bits
+# make the buckets smaller and the lookups faster.
+class LSHIndex:
+  def __init__(self, prefs, tables=16, bits=6, probes=0, seed=0 ):
+    self.tables=tables
+    self.bits=bits
+    self.probes=probes
+    self.random=random.Random(seed)
+    # item -> its weight in every hyperplane, drawn the first time it's seen
+    self.weights={}
+    # person -> their position in prefs, so candidates come back in that order
+    self.order={}
+    self.buckets=[{} for t in range(tables)]
+
+    for person in prefs:
+      self.order[person]=len(self.order)
+      for bucket,key in zip(self.buckets,self.keys(prefs[person])):
+        bucket.setdefault(key,[]).append(person)
+
+  # the bucket a vector falls into in each table
+  def keys(self, vector ):
+    planes=self.tables*self.bits
+    sums=[0.0]*planes
+    if vector:
+      mean=sum(vector.values())/len(vector)
+      for item,value in vector.items():
+        weights=self.weights.get(item)
+        if weights is None:
+          weights=self.weights[item]=[self.random.gauss(0,1) for p in range(planes)]
+        value-=mean
+        if value==0: continue
+        sums=[s+value*w for s,w in zip(sums,weights)]
+
+    keys=[]
+    for t in range(self.tables):
+      key=0
+      for b in range(self.bits):
+        if sums[t*self.bits+b]>0: key|=1<<b
+      keys.append(key)
+    return keys
+
+  # the people filed near vector, in prefs order
+  def candidates(self, vector ):
+    found=set()
+    for bucket,key in zip(self.buckets,self.keys(vector)):
+      found.update(bucket.get(key,()))
+      if self.probes:
+        for b in range(self.bits):
+          found.update(bucket.get(key^(1<<b),()))
+    return sorted(found,key=self.order.__getitem__)
+
 ###########################################################################
 # topmatches
 ###########################################################################
 
 # Returns the best matches for person from the prefs dictionary.
 # Number of results and similarity function are optional params.
-def topMatches(prefs, person, n=5, similarity=sim_pearson ):
+# With an LSHIndex built over prefs only its candidates are scored, so the
+# matches are approximate
+def topMatches(prefs, person, n=5, similarity=sim_pearson, index=None ):
+  others=prefs if index is None else index.candidates(prefs[person])
   scores=[(similarity(prefs,person,other),other)
-                  for other in prefs if other!=person]
-  scores.sort()
-  scores.reverse()
-  return scores[0:n]
+                  for other in others if other!=person]
+  return heapq.nlargest(n,scores)
 
 ###########################################################################
 # getRecommendations
 ###########################################################################
 
 # Gets recommendations for a person by using a weighted average
-# of every other user's rankings
-def getRecommendations(prefs, person, similarity=sim_pearson ):
+# of every other user's rankings, or with an LSHIndex over prefs, the
+# rankings of the people it finds near them
+def getRecommendations(prefs, person, similarity=sim_pearson, index=None ):
   totals={}
   simSums={}
-  for other in prefs:
+  others=prefs if index is None else index.candidates(prefs[person])
+  for other in others:
     # don't compare me to myself
     if other==person: continue
     sim=similarity(prefs,person,other)
@@ -159,23 +231,101 @@ def transformPrefs(prefs ):
   return result
 
 
+###########################################################################
+# sparse item similarity
+###########################################################################
+
+# itemPrefs and userRows are the same sparse item x user matrix stored by item
+# and by user: userRows has every user's (item, value, value squared) (see
+# userRows). Walking item's users and then each user's row reaches exactly the
+# items that share a user with item, so the sums sim_pearson/sim_distance need
+# for all of them take one pass over those users' rows instead of a dict
+# intersection per pair. The sums are added in the order of item's users, the
+# order sim_pearson and sim_distance add them in, so the scores come out the same.
+
+def userRows(prefs ):
+  return dict((user,[(item,value,pow(value,2)) for item,value in prefs[user].items()])
+              for user in prefs)
+
+# The Pearson score of item against every item it shares a user with,
+# as (score, other)
+def sharedPearson(itemPrefs, rows, item ):
+  sums={}
+  for user,x in itemPrefs[item].items():
+    xSq=pow(x,2)
+    for other,y,ySq in rows[user]:
+      if other==item: continue
+      s=sums.get(other)
+      if s is None: s=sums[other]=[0,0,0,0,0,0]
+      s[0]+=1
+      s[1]+=x
+      s[2]+=y
+      s[3]+=xSq
+      s[4]+=ySq
+      s[5]+=x*y
+
+  scores=[]
+  for other,(n,sumX,sumY,sumXSq,sumYSq,sumXY) in sums.items():
+    num=sumXY-(sumX*sumY/n)
+    try:
+      den=sqrt((sumXSq-pow(sumX,2)/n)*(sumYSq-pow(sumY,2)/n))
+    except:
+      den=0
+    scores.append((num/den if den!=0 else 0,other))
+  return scores
+
+# The same with sim_distance
+def sharedDistance(itemPrefs, rows, item ):
+  sums={}
+  for user,x in itemPrefs[item].items():
+    for other,y,ySq in rows[user]:
+      if other==item: continue
+      sums[other]=sums.get(other,0)+pow(x-y,2)
+  return [(1/(1+sum_of_squares),other) for other,sum_of_squares in sums.items()]
+
+sharedScores={sim_pearson: sharedPearson, sim_distance: sharedDistance}
+
 ###########################################################################
 # calculateSimilarItems
 ###########################################################################
 
-def calculateSimilarItems(prefs, n=10 ):
+# Items that share no users with item score 0, and topMatches breaks ties by
+# name, so after the scores of the items that do share users only the n
+# highest names among the others can make the top n. names is every item,
+# highest first
+def topSharedMatches(scores, names, item, n ):
+  shared=set(other for score,other in scores)
+  candidates=list(scores)
+  zeros=0
+  for other in names:
+    if zeros==n: break
+    if other==item or other in shared: continue
+    candidates.append((0,other))
+    zeros+=1
+  return heapq.nlargest(n,candidates)
+
+def calculateSimilarItems(prefs, n=10, similarity=sim_pearson ):
     # Create a dictionary of items showing which other items they
-    # are most similar to.
+    # are most similar to, the same lists topMatches( itemPrefs, item, n=n,
+    # similarity=similarity ) gives. Pearson and Euclidean scores are worked
+    # out for one item at a time from the sparse matrix, and only its top
+    # n are kept
     result={}
     # Invert the preference matrix to be item-centric
     itemPrefs = transformPrefs( prefs )
+    shared = sharedScores.get( similarity )
+    rows = userRows( prefs )
+    names = sorted( itemPrefs, reverse=True )
     c=0
     for item in itemPrefs:
       # Status updates for large datasets
       c+=1
       if c%100==0: print( "%d / %d" % (c,len(itemPrefs)) )
       # Find the most similar items to this one
-      scores = topMatches( itemPrefs, item, n=n, similarity=sim_pearson )
+      if shared is None:
+        scores = topMatches( itemPrefs, item, n=n, similarity=similarity )
+      else:
+        scores = topSharedMatches( shared( itemPrefs, rows, item ), names, item, n )
       result[item] = scores
     return result
 
@@ -1,10 +1,14 @@
-import os, glob, json, re, random
+import os, sys, glob, json, re, random
 from os.path import join
 from math import sqrt
 from pprint import pprint
 
 import collab_filter
 
+# the repository root, so the bill index in helpers/ can be imported
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.bill_index import bill_index, bill_key
+
 votesdir = 'data'
 exten = '.json'
 
@@ -51,7 +55,9 @@ class Classifier:
       self.prefs[feature] = fcount / total
 
 
-def mparseFeatures(votePath=votesdir):
+# bills is the bill index from helpers/bill_index.py, loaded from data/ if not given
+def mparseFeatures(votePath=votesdir, bills=None):
+  if bills is None: bills = bill_index()
   classes = []
   seen_class = {}
 
@@ -72,15 +78,10 @@ def mparseFeatures(votePath=votesdir):
 
                 try: 
                   # print("Found Aye or Yay")
-                  bill_path = "data/bills_%d/%s/%s%d/data.json" % (
+                  subjects = bills[bill_key(
                       vote_data["bill"]["congress"],
                       vote_data["bill"]["type"],
-                      vote_data["bill"]["type"],
-                      vote_data["number"] )
-
-                  with open(bill_path) as bill_file:
-                      # print("Found bill file")
-                      bill_data = json.load(bill_file)
+                      vote_data["number"] )][0]
 
                   for status in vote_data["votes"].keys():
                       for vote in vote_data["votes"][status]:
@@ -94,9 +95,8 @@ def mparseFeatures(votePath=votesdir):
                               classes.append(clas)
                               seen_class[class_id] = clas
 
-                          for subject in bill_data["subjects"]:
+                          for subject in subjects:
                               clas.incrFeatureCount(subject, status)
-                  bill_file.close()
                   vote_file.close()
 
                 except:
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+'''
+    Benchmarks for the hot paths, run from the repository root:
+
+        python helpers/benchmark.py --output bench.json
+        python helpers/benchmark.py --baseline bench.json
+
+    The bayes benchmarks run against the bundled data_distilled files, the
+    analysis and collaborative filter ones against synthetic data with a fixed
+    seed. The LSHIndex results include its recall against the exact
+    topMatches. Every result is the best of --repeat runs. With --baseline,
+    any result more than --tolerance worse than the baseline is reported and
+    the script exits with status 1.
+'''
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+sys.path.append(os.path.join(ROOT, "collab_filter"))
+
+import bayes_bills_distilled
+import collab_filter
+from classifier import load
+from helpers.summarize import Analysis
+
+TRAIN = ["data_distilled/data_distilled_111.csv", "data_distilled/data_distilled_112.csv"]
+PREDICT = "data_distilled/data_distilled_113.csv"
+
+# whether a bigger number is better for each kind of result
+HIGHER_IS_BETTER = {"per_sec": True, "seconds": False, "bytes": False, "kib": False, "recall": True}
+
+# runs fn `repeat` times and returns the fastest wall time and the last result
+def best_of(repeat, fn):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_bayes(results, repeat):
+    rows = [row for path in TRAIN for row in bayes_bills_distilled.read_distilled(path)]
+    items = [data for data, result in bayes_bills_distilled.read_distilled(PREDICT)]
+
+    def train():
+        predictor = bayes_bills_distilled.naivebayes(bayes_bills_distilled.get_features, flip=True)
+        for data, result in rows:
+            predictor.train(data, result)
+        return predictor
+    seconds, predictor = best_of(repeat, train)
+    results["train.bills.per_sec"] = len(rows) / seconds
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.model")
+        seconds, _ = best_of(repeat, lambda: predictor.save(path))
+        results["model.save.seconds"] = seconds
+        results["model.size.bytes"] = os.path.getsize(path)
+        seconds, loaded = best_of(repeat, lambda: load(path, bayes_bills_distilled.get_features))
+        results["model.load.seconds"] = seconds
+
+        def classify():
+            loaded.compile()
+            return loaded.batchclassify(items)
+        seconds, _ = best_of(repeat, classify)
+        results["classify.bills.per_sec"] = len(items) / seconds
+
+    # the uncompiled path scores one bill at a time through weightedprob
+    def classify_uncompiled():
+        predictor.compiled = False
+        return [predictor.classify(item) for item in items]
+    seconds, _ = best_of(repeat, classify_uncompiled)
+    results["classify_uncompiled.bills.per_sec"] = len(items) / seconds
+
+def bench_analysis(results, repeat, rng):
+    subjects = ["subject %d" % i for i in range(400)]
+    analysis = Analysis(None)
+    for bill in range(20000):
+        analysis.feature_dict["bill%d" % bill] = rng.sample(subjects, rng.randint(1, 8)) + [rng.random() < 0.05]
+
+    seconds, _ = best_of(repeat, analysis.likelyFeatures)
+    results["analysis.likely_features.bills.per_sec"] = len(analysis.feature_dict) / seconds
+
+# a users x items preference dict shaped like the vote percentages collab_predictor builds
+def synthetic_prefs(rng, users, items, density):
+    prefs = {}
+    for user in range(users):
+        prefs["user%d" % user] = {"item%d" % item: rng.random()
+                                  for item in range(items) if rng.random() < density}
+    return prefs
+
+def bench_collab(results, repeat, rng):
+    prefs = synthetic_prefs(rng, 80, 200, 0.3)
+
+    seconds, _ = best_of(repeat, lambda: collab_filter.calculateSimilarItems(prefs, n=10))
+    results["collab.similar_items.items.per_sec"] = 200 / seconds
+
+    people = list(prefs)
+    seconds, _ = best_of(repeat, lambda: [collab_filter.topMatches(prefs, person, n=5) for person in people])
+    results["collab.top_matches.calls.per_sec"] = len(people) / seconds
+
+    seconds, _ = best_of(repeat, lambda: [collab_filter.getRecommendations(prefs, person) for person in people])
+    results["collab.recommendations.calls.per_sec"] = len(people) / seconds
+
+# users in `groups` groups whose ratings are their group's plus some noise, so
+# that nearest neighbours mean something
+def clustered_prefs(rng, users, items, groups, density):
+    tastes = [[rng.random() for item in range(items)] for group in range(groups)]
+    prefs = {}
+    for user in range(users):
+        taste = tastes[user % groups]
+        prefs["user%d" % user] = {"item%d" % item: min(1.0, max(0.0, taste[item] + rng.gauss(0, 0.1)))
+                                  for item in range(items) if rng.random() < density}
+    return prefs
+
+# topMatches through an LSHIndex against the exact topMatches: the share of
+# the exact top n it finds, and the speed of both. each knob setting is
+# (tables, bits, probes)
+def bench_lsh(results, repeat, rng, knobs = ((8, 8, 0), (16, 6, 0), (8, 8, 1))):
+    prefs = clustered_prefs(rng, 1000, 200, 20, 0.5)
+    people = rng.sample(sorted(prefs), 30)
+    n = 10
+
+    seconds, exact = best_of(repeat, lambda: [collab_filter.topMatches(prefs, person, n=n) for person in people])
+    results["collab.exact_top_matches.calls.per_sec"] = len(people) / seconds
+
+    for tables, bits, probes in knobs:
+        name = "collab.lsh_top_matches.t%d_b%d_p%d" % (tables, bits, probes)
+        seconds, index = best_of(1, lambda: collab_filter.LSHIndex(prefs, tables, bits, probes))
+        results[name + ".build.seconds"] = seconds
+        seconds, approximate = best_of(repeat, lambda: [collab_filter.topMatches(prefs, person, n=n, index=index)
+                                                        for person in people])
+        results[name + ".calls.per_sec"] = len(people) / seconds
+        found = sum(len(set(e) & set(a)) for e, a in zip(exact, approximate))
+        results[name + ".recall"] = found / float(n * len(people))
+
+def run(repeat, seed):
+    rng = random.Random(seed)
+    results = {}
+    bench_bayes(results, repeat)
+    bench_analysis(results, repeat, rng)
+    bench_collab(results, repeat, rng)
+    bench_lsh(results, repeat, rng)
+    # ru_maxrss is in KiB on Linux
+    results["peak_rss.kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+# the results that are more than `tolerance` worse than the baseline, as messages
+def regressions(results, baseline, tolerance):
+    messages = []
+    for name, value in sorted(results.items()):
+        if name not in baseline or not baseline[name]:
+            continue
+        higher = HIGHER_IS_BETTER[name.rsplit(".", 1)[1]]
+        change = (value - baseline[name]) / baseline[name]
+        if (higher and change < -tolerance) or (not higher and change > tolerance):
+            messages.append("%s: %.6g -> %.6g (%+.1f%%)" % (name, baseline[name], value, 100 * change))
+    return messages
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark training, model I/O and classification")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression, as a fraction")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    results = run(args.repeat, args.seed)
+    for name, value in sorted(results.items()):
+        print("%-42s %14.6g" % (name, value))
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            failed = regressions(results, json.load(baseline_file), args.tolerance)
+        if failed:
+            print("\nREGRESSIONS against %s:" % args.baseline)
+            for message in failed:
+                print("  " + message)
+            sys.exit(1)
+        print("\nno regressions against %s" % args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+
+'''
+    An index of every bill under the data directory: bill_id -> (subjects,
+    sponsor, status), so roll calls can be joined to their bills without
+    opening the bill JSON once per vote file.
+
+    The index is kept in an SQLite database (data/bill_index.db by default)
+    with one row per bill, and loaded into a dict. The bill_id of a bill is
+    its directory name and congress, e.g. hr1234-113 for
+    data/bills_113/hr/hr1234/data.json, which is the path the vote scripts
+    used to build (see bill_key). Every bills_<congress> directory is
+    stamped with its file count, total size and newest modification time,
+    and only directories whose stamp has changed are parsed again.
+
+    python helpers/bill_index.py [data directory] [database] builds it ahead
+    of time; bill_index() builds or refreshes it on first use otherwise.
+'''
+
+# the bill_id of the bill a roll call is about, given the congress, bill type
+# and number it names
+def bill_key(congress, bill_type, number):
+    return "%s%d-%d" % (bill_type, number, congress)
+
+# the bills_<congress> directories under path, with their congresses
+def bill_dirs(path):
+    dirs = []
+    for name in sorted(os.listdir(path)):
+        if name.startswith("bills_") and name[6:].isdigit() and os.path.isdir(os.path.join(path, name)):
+            dirs.append((os.path.join(path, name), int(name[6:])))
+    return dirs
+
+# the data.json of every bill in a bills_<congress> directory, and the
+# directory's stamp
+def bill_files(bills_dir):
+    paths = []
+    count, size, newest = 0, 0, 0
+    for dirpath, dirs, files in os.walk(bills_dir):
+        for name in files:
+            info = os.stat(os.path.join(dirpath, name))
+            count += 1
+            size += info.st_size
+            newest = max(newest, info.st_mtime_ns)
+            if name == "data.json" and len(os.path.relpath(dirpath, bills_dir).split(os.sep)) == 2:
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths), [count, size, newest]
+
+# the index row of one bill: (bill_id, congress, sponsor, status, subjects as
+# JSON). anything the bill doesn't have is None, bills that can't be read are None
+def index_row(job):
+    bill_path, congress = job
+    try:
+        with open(bill_path) as bill_file:
+            data = json.load(bill_file)
+    except (OSError, ValueError):
+        return None
+
+    sponsor = data.get("sponsor")
+    sponsor = sponsor.get("name") if isinstance(sponsor, dict) else None
+    subjects = data.get("subjects")
+    bill_id = "%s-%d" % (os.path.basename(os.path.dirname(bill_path)), congress)
+    return (bill_id, congress, sponsor, data.get("status"),
+            json.dumps(subjects) if subjects is not None else None)
+
+# brings the index in database up to date with the bills under path, parsing
+# the bills of changed congresses with a pool of `processes` workers (all
+# cores if None)
+def update_index(database = "data/bill_index.db", path = "data", processes = None):
+    connection = sqlite3.connect(database)
+    with connection:
+        connection.execute("create table if not exists bill_index (bill_id text primary key, congress int, "
+                           "sponsor text, status text, subjects text)")
+        connection.execute("create table if not exists bill_index_stamps (directory text primary key, stamp text)")
+        stamps = dict(connection.execute("select directory, stamp from bill_index_stamps"))
+
+        for bills_dir, congress in bill_dirs(path):
+            paths, stamp = bill_files(bills_dir)
+            if stamps.get(bills_dir) == json.dumps(stamp):
+                continue
+
+            pool = multiprocessing.Pool(processes)
+            try:
+                rows = [row for row in pool.imap(index_row, [(bill_path, congress) for bill_path in paths], chunksize = 64)
+                        if row is not None]
+            finally:
+                pool.close()
+                pool.join()
+
+            connection.execute("delete from bill_index where congress = ?", (congress,))
+            connection.executemany("insert or replace into bill_index values (?, ?, ?, ?, ?)", rows)
+            connection.execute("insert or replace into bill_index_stamps values (?, ?)", (bills_dir, json.dumps(stamp)))
+            print("indexed %d bills in %s" % (len(rows), bills_dir))
+    connection.close()
+
+# bill_id -> (subjects, sponsor, status) for every bill under path, from the
+# index in database, updating it first if any bills have changed. subjects,
+# sponsor and status are None for bills that don't have them
+def bill_index(database = "data/bill_index.db", path = "data", processes = None):
+    update_index(database, path, processes)
+    connection = sqlite3.connect(database)
+    try:
+        return {bill_id: (json.loads(subjects) if subjects is not None else None, sponsor, status)
+                for bill_id, subjects, sponsor, status
+                in connection.execute("select bill_id, subjects, sponsor, status from bill_index")}
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else "data"
+    database = sys.argv[2] if len(sys.argv) > 2 else os.path.join(path, "bill_index.db")
+    update_index(database, path)
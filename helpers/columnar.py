@@ -0,0 +1,115 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+'''
+    A columnar version of the distilled bill files, written next to the
+    tab separated ones by helpers/distill.py.
+
+    Sponsors and subjects are stored once each and referred to by integer
+    codes, and the subjects of every bill are a CSR-style range of an index
+    array:
+
+        magic (8 bytes) | version (u32) | header length (u32) | JSON header
+        padding to 8 bytes | sponsor (u32 x bills) | status (u32 x bills)
+        offsets (u32 x bills + 1) | subjects (u32 x total subjects)
+
+    The subjects of bill i are subjects[offsets[i]:offsets[i + 1]]. The header
+    holds the sponsor and subject names in code order.
+'''
+
+MAGIC = b"DISTCOL\0"
+VERSION = 1
+
+# writes (sponsor, status, subjects) rows to path in the columnar format
+def write_columnar(rows, path):
+    sponsor_codes = {}
+    subject_codes = {}
+    sponsors = array('I')
+    statuses = array('I')
+    offsets = array('I', [0])
+    subjects = array('I')
+
+    for sponsor, status, bill_subjects in rows:
+        sponsors.append(sponsor_codes.setdefault(sponsor, len(sponsor_codes)))
+        statuses.append(int(status))
+        for subject in bill_subjects:
+            subjects.append(subject_codes.setdefault(subject, len(subject_codes)))
+        offsets.append(len(subjects))
+
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "bills": len(sponsors),
+        "sponsors": list(sponsor_codes),
+        "subjects": list(subject_codes),
+    }).encode("utf-8")
+
+    with open(path, "wb") as col_file:
+        col_file.write(struct.pack("<8sII", MAGIC, VERSION, len(header)))
+        col_file.write(header)
+        col_file.write(b"\0" * (-(16 + len(header)) % 8))
+        for column in (sponsors, statuses, offsets, subjects):
+            col_file.write(column)
+
+# splits a tab separated distilled row into (sponsor, status, subjects). bills
+# without subjects are distilled with only two columns, they get no subjects
+def split_row(line):
+    row = line.rstrip("\n").split("\t")
+    return row[0], row[1], row[2].split("|") if len(row) > 2 else []
+
+# converts a tab separated distilled file into the columnar format
+def tsv_to_columnar(tsv_path, path):
+    with open(tsv_path, "r") as csv_file:
+        write_columnar((split_row(line) for line in csv_file), path)
+
+# the columnar file that goes with a tab separated distilled file
+def columnar_path(tsv_path):
+    return os.path.splitext(tsv_path)[0] + ".col"
+
+class Columnar:
+    # maps a columnar file; the columns are views of the mapping, nothing is
+    # copied except the sponsor and subject names in the header
+    def __init__(self, path):
+        with open(path, "rb") as col_file:
+            self.mapped = mmap.mmap(col_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, length = struct.unpack_from("<8sII", self.mapped)
+        if magic != MAGIC:
+            raise ValueError("%s is not a columnar distilled file" % path)
+        if version != VERSION:
+            raise ValueError("%s is a version %d file, expected version %d" % (path, version, VERSION))
+
+        header = json.loads(self.mapped[16:16 + length].decode("utf-8"))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("%s was written on a %s-endian machine" % (path, header["byteorder"]))
+
+        self.sponsor_names = header["sponsors"]
+        self.subject_names = header["subjects"]
+        bills = header["bills"]
+
+        view = memoryview(self.mapped)
+        offset = 16 + length + (-(16 + length) % 8)
+        self.sponsors = view[offset:offset + 4 * bills].cast("I")
+        offset += 4 * bills
+        self.statuses = view[offset:offset + 4 * bills].cast("I")
+        offset += 4 * bills
+        self.offsets = view[offset:offset + 4 * (bills + 1)].cast("I")
+        offset += 4 * (bills + 1)
+        self.subjects = view[offset:].cast("I")
+
+    def __len__(self):
+        return len(self.sponsors)
+
+    # yields (sponsor, status, subjects) for bills start to end (all of them by
+    # default), reusing the name strings from the header
+    def rows(self, start = 0, end = None):
+        sponsor_names = self.sponsor_names
+        subject_names = self.subject_names
+        subjects = self.subjects
+        offsets = self.offsets
+        for i in range(start, len(self.sponsors) if end is None else end):
+            yield (sponsor_names[self.sponsors[i]], self.statuses[i],
+                   [subject_names[s] for s in subjects[offsets[i]:offsets[i + 1]]])
@@ -1,7 +1,7 @@
 -- drop tables
 
 drop table if exists bills;
-drop table if exists bill_subjects;
+drop table if exists bills_subjects;
 
 -- create tables
 
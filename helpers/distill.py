@@ -3,6 +3,14 @@ import os
 import json
 import csv
 import sys
+import multiprocessing
+import sqlite3
+
+# the repository root, so the helpers package can be imported when this is run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bayesian_classifer"))
+from helpers.columnar import write_columnar, tsv_to_columnar, columnar_path, split_row
+from classifier import extractorid
 
 '''
     The Basic ERD for bills (at least for our purposes) is as follows
@@ -14,62 +22,176 @@ import sys
 def process_states_simple(status):
     return str(1 if "ENACTED" in status else 0)
 
-def distill_3NF(path, out = 'data_distilled/distilled_bills_subjects.csv'):
-    bill_csv =  open(out, 'w')
-    bill_csv_writer = csv.writer(bill_csv, delimiter='\t', quoting=csv.QUOTE_MINIMAL)
-
-    bill_subject_csv =  open(out, 'w')
-    bill_subject_csv_writer = csv.writer(bill_subject_csv, delimiter='\t', quoting=csv.QUOTE_MINIMAL)
-
+# the rows one bill contributes to the normalized tables: (bill_id, sponsor,
+# status) for bills and (bill_id, subject) for each of its subjects. returns
+# None for bills without an id, sponsor or status
+def distill_3NF_rows(bill_path):
+    with open(bill_path) as data_file:
+        data = json.load(data_file)
+
+    try:
+        bill_row = [data["bill_id"], data["sponsor"]["name"], process_states_simple(data["status"])]
+    except (KeyError, TypeError):
+        # this is the case of malformed JSON
+        return None
+
+    subject_rows = [[data["bill_id"], subject] for subject in data.get("subjects", [])]
+    return bill_row, subject_rows
+
+# the distilled row for one bill: sponsor, status and the subjects joined with
+# pipes (a bill without subjects ends up with only two columns). returns None
+# for bills that are missing any of those
+def distill_1NF_row(bill_path):
+    with open(bill_path) as data_file:
+        data = json.load(data_file)
+
+    try:
+        row_buffer = data["sponsor"]["name"] + "\t" + process_states_simple(data["status"]) + "\t"
+
+        for subject in data["subjects"]:
+            row_buffer += subject + "|"
+    except (KeyError, TypeError):
+        # this is the case of malformed JSON
+        return None
+
+    return row_buffer[:-1]
+
+def bill_files(path):
+    bill_paths = []
     for path, dirs, files in os.walk(path):
         for data_file in files:
-            bill_path = path + "/" + data_file
-
-            data_file = open(bill_path)
-            data = json.load(data_file)
-
-            try:
-                
-                bill_csv_row = [data["bill_id"], data["sponsor"]["name"], process_states_simple(data["status"])]
-                # print(bill_csv_row)
-                bill_csv_writer.writerow(bill_csv_row)
-
-                for subject in data["subjects"]:
-                    bill_subject_csv_row = [data["bill_id"], subject]
-                    bill_subject_csv_writer.writerow(bill_subject_csv_row)
-
-            except:
-                # this is the case of malformed JSON
-                pass
-
-def distill_1NF(path, out = 'data_distilled/distilled_bills_1NF.csv'):
-    bill_csv =  open(out, 'w')
-
-    for path, dirs, files in os.walk(path):
-        for data_file in files:
-            bill_path = path + "/" + data_file
-
-            data_file = open(bill_path)
-            data = json.load(data_file)
-
-            try:
-
-                row_buffer = data["sponsor"]["name"] + "\t" + process_states_simple(data["status"]) + "\t"
-                
-                # bill_csv_row = [data["bill_id"], data["sponsor"]["name"], process_states_simple(data["status"])]
-                # print(bill_csv_row)
-
-                for subject in data["subjects"]:
-                    row_buffer += subject + "|"
-
-                row_buffer = row_buffer[:-1]
-
-                # print(row_buffer)
-                bill_csv.write(row_buffer + "\n")
-            except:
-                # this is the case of malformed JSON
-                pass
-
-    bill_csv.close()
-
-distill_1NF(sys.argv[1], sys.argv[2])
+            if ".json" in data_file:
+                bill_paths.append(path + "/" + data_file)
+    return sorted(bill_paths)
+
+# writes one row per bill under path to out, in sorted path order. bills are
+# parsed by a pool of `processes` workers (all cores if None). the row and
+# modification time of every bill are kept in a manifest next to the output,
+# so running it again only parses the bills that are new or have changed. the
+# manifest is thrown away if distill_1NF_row (or anything it calls) has changed.
+# the same rows are also written in the columnar format (see helpers/columnar.py)
+def distill_1NF(path, out = 'data_distilled/distilled_bills_1NF.csv', processes = None):
+    manifest_path = out + '.manifest'
+    parser = extractorid(distill_1NF_row)
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as manifest_file:
+            saved = json.load(manifest_file)
+        if saved.get("parser") == parser:
+            manifest = saved["bills"]
+
+    bill_paths = bill_files(path)
+    mtimes = [os.stat(bill_path).st_mtime_ns for bill_path in bill_paths]
+    stale = [bill_path for bill_path, mtime in zip(bill_paths, mtimes)
+             if bill_path not in manifest or manifest[bill_path][0] != mtime]
+
+    if stale:
+        pool = multiprocessing.Pool(processes)
+        try:
+            rows = pool.map(distill_1NF_row, stale, chunksize = 64)
+        finally:
+            pool.close()
+            pool.join()
+        parsed = dict(zip(stale, rows))
+    else:
+        parsed = {}
+
+    # bills that have been deleted since the last run drop out of the manifest
+    updated = {}
+    for bill_path, mtime in zip(bill_paths, mtimes):
+        row = parsed[bill_path] if bill_path in parsed else manifest[bill_path][1]
+        updated[bill_path] = [mtime, row]
+
+    with open(out, 'w') as bill_csv:
+        for bill_path in bill_paths:
+            row = updated[bill_path][1]
+            if row is not None:
+                bill_csv.write(row + "\n")
+
+    rows = [updated[bill_path][1] for bill_path in bill_paths]
+    write_columnar((split_row(row) for row in rows if row is not None), columnar_path(out))
+
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump({"parser": parser, "bills": updated}, manifest_file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    print("distilled %d bills, %d of them parsed this run" % (len(bill_paths), len(stale)))
+
+# writes the bills and bill subjects tables for every bill under path to the files
+# helpers/create_congress_database.sql imports, as tab separated CSV with quoting.
+# bills are parsed by a pool of `processes` workers (all cores if None) and written
+# in sorted path order. if database is given the tables are also loaded into it
+def distill_3NF(path, out_dir = 'data_distilled', database = None, processes = None):
+    bill_paths = bill_files(path)
+    pool = multiprocessing.Pool(processes)
+    try:
+        parsed = [rows for rows in pool.imap(distill_3NF_rows, bill_paths, chunksize = 64) if rows is not None]
+    finally:
+        pool.close()
+        pool.join()
+
+    bills = [bill_row for bill_row, subject_rows in parsed]
+    bill_subjects = [subject_row for bill_row, subject_rows in parsed for subject_row in subject_rows]
+
+    for name, rows in (('distilled_bills.csv', bills), ('distilled_bills_subjects.csv', bill_subjects)):
+        with open(os.path.join(out_dir, name), 'w', newline = '', buffering = 1 << 20) as table_csv:
+            writer = csv.writer(table_csv, delimiter = '\t', quoting = csv.QUOTE_MINIMAL, lineterminator = '\n')
+            writer.writerows(rows)
+
+    if database is not None:
+        load_sqlite(database, bills, bill_subjects)
+
+    print("distilled %d bills with %d subjects" % (len(bills), len(bill_subjects)))
+
+# loads bills and bill subjects rows into an SQLite database with the tables from
+# helpers/create_congress_database.sql, plus the congress of every bill, indexed on
+# bill_id, sponsor, subject and congress. bills already loaded for the same
+# congresses are replaced
+def load_sqlite(database, bills, bill_subjects):
+    connection = sqlite3.connect(database)
+    with connection:
+        connection.execute("create table if not exists bills (bill_id text primary key, sponsor text, status int, congress int)")
+        connection.execute("create table if not exists bills_subjects (bill_id text, subject text, congress int)")
+
+        congresses = set(congress_of(bill_row[0]) for bill_row in bills)
+        for congress in congresses:
+            connection.execute("delete from bills where congress = ?", (congress,))
+            connection.execute("delete from bills_subjects where congress = ?", (congress,))
+
+        connection.executemany("insert or replace into bills values (?, ?, ?, ?)",
+                               ((bill_id, sponsor, int(status), congress_of(bill_id)) for bill_id, sponsor, status in bills))
+        connection.executemany("insert into bills_subjects values (?, ?, ?)",
+                               ((bill_id, subject, congress_of(bill_id)) for bill_id, subject in bill_subjects))
+
+        # building the indexes after the rows are in is faster than keeping them up to date
+        connection.execute("create index if not exists bills_sponsor on bills (sponsor)")
+        connection.execute("create index if not exists bills_congress on bills (congress)")
+        connection.execute("create index if not exists bills_subjects_bill_id on bills_subjects (bill_id)")
+        connection.execute("create index if not exists bills_subjects_subject on bills_subjects (subject)")
+        connection.execute("create index if not exists bills_subjects_congress on bills_subjects (congress)")
+    connection.close()
+
+# bill ids end in the congress they were introduced in, e.g. hr1234-113
+def congress_of(bill_id):
+    return int(bill_id.rsplit('-', 1)[1])
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--columnar':
+        # converts distilled files that already exist, e.g. data_distilled/*.csv
+        for tsv_path in sys.argv[2:]:
+            tsv_to_columnar(tsv_path, columnar_path(tsv_path))
+            print("wrote %s" % columnar_path(tsv_path))
+        sys.exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == '--3NF':
+        # writes the normalized tables, and loads them into the SQLite database if one is given
+        distill_3NF(sys.argv[2], database = sys.argv[3] if len(sys.argv) > 3 else None)
+        sys.exit(0)
+
+    if len(sys.argv) < 3:
+        print("usage: python helpers/distill.py <bill directory> <output file> [processes]")
+        print("       python helpers/distill.py --columnar <distilled file>...")
+        print("       python helpers/distill.py --3NF <bill directory> [sqlite database]")
+        sys.exit(1)
+
+    distill_1NF(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else None)
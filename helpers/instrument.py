@@ -0,0 +1,162 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+
+'''
+    Opt-in instrumentation for the predictor scripts.
+
+    Nothing here runs unless it is asked for, either with the environment
+    variable PREDICT_INSTRUMENT or an --instrument flag:
+
+        PREDICT_INSTRUMENT=timing python bayes_bills_distilled.py
+        python bayes_bills_distilled.py --instrument=timing,cprofile,tracemalloc
+
+    "timing" (also what a bare --instrument or PREDICT_INSTRUMENT=1 means)
+    wraps the functions a script registers with install() so they record
+    call counts and wall time per stage; "cprofile" and "tracemalloc" run the
+    whole script under those. The report is printed at the end of the run and
+    written as JSON to PREDICT_INSTRUMENT_REPORT (instrument.json by default).
+
+    When instrumentation is off install() is never called, so the scripts run
+    their original, unwrapped functions. Stage times are inclusive (training
+    time includes the feature extraction it calls) and only count the main
+    process, not pool workers.
+'''
+
+ENV = "PREDICT_INSTRUMENT"
+REPORT_ENV = "PREDICT_INSTRUMENT_REPORT"
+MODES = {"timing", "cprofile", "tracemalloc"}
+
+# stage -> [calls, seconds]
+stages = {}
+
+# the modes asked for with --instrument[=modes] (which is removed from argv) or
+# the environment variable, as a set; empty when instrumentation is off
+def requested(argv = sys.argv):
+    value = os.environ.get(ENV, "")
+    for arg in list(argv[1:]):
+        if arg == "--instrument" or arg.startswith("--instrument="):
+            argv.remove(arg)
+            value = arg.partition("=")[2] or "timing"
+
+    if value.lower() in ("", "0", "no", "off"):
+        return set()
+    if value.lower() in ("1", "yes", "on"):
+        return {"timing"}
+    modes = set(mode.strip() for mode in value.split(",") if mode.strip())
+    unknown = modes - MODES
+    if unknown:
+        raise ValueError("unknown instrumentation mode(s) %s, expected some of %s"
+                         % (", ".join(sorted(unknown)), ", ".join(sorted(MODES))))
+    return modes
+
+def record(stage, seconds):
+    entry = stages.setdefault(stage, [0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+
+# a version of fn that records its calls under stage. generators are timed
+# per item, so a stage streaming a file counts the reading and not the work
+# the caller does between items
+def timed(fn, stage):
+    clock = time.perf_counter
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            entry = stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            iterator = fn(*args, **kwargs)
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    entry[1] += clock() - start
+                    return
+                entry[1] += clock() - start
+                yield item
+        return wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(stage, clock() - start)
+    return wrapper
+
+# replaces the functions or methods named in targets, (owner, name, stage)
+# triples where owner is a module or class, with timed versions of themselves.
+# functools.wraps keeps their names and source, so pickling them by name and
+# extractorid() still work
+def install(targets):
+    for owner, name, stage in targets:
+        setattr(owner, name, timed(owner.__dict__[name], stage))
+
+# runs main() under the given modes and reports on it afterwards
+def run(main, modes, targets, top = 25):
+    if "timing" in modes:
+        install(targets)
+
+    profiler = None
+    if "cprofile" in modes:
+        import cProfile
+        profiler = cProfile.Profile()
+    if "tracemalloc" in modes:
+        import tracemalloc
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.runcall(main)
+        else:
+            main()
+    finally:
+        report = {"modes": sorted(modes), "seconds": time.perf_counter() - start}
+        if "timing" in modes:
+            report["stages"] = {stage: {"calls": calls, "seconds": seconds}
+                                for stage, (calls, seconds) in stages.items()}
+        if profiler is not None:
+            report["cprofile"] = profile_report(profiler, top)
+        if "tracemalloc" in modes:
+            report["tracemalloc"] = memory_report(top)
+            tracemalloc.stop()
+        write_report(report)
+
+# the `top` functions by cumulative time
+def profile_report(profiler, top):
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    rows = []
+    for (filename, line, function), (cc, calls, tottime, cumtime, callers) in stats.items():
+        rows.append({"function": "%s:%d(%s)" % (os.path.basename(filename), line, function),
+                     "calls": calls, "tottime": tottime, "cumtime": cumtime})
+    rows.sort(key = lambda row: row["cumtime"], reverse = True)
+    return rows[:top]
+
+# the peak traced memory and the `top` allocation sites still alive at the end
+def memory_report(top):
+    import tracemalloc
+    current, peak = tracemalloc.get_traced_memory()
+    sites = tracemalloc.take_snapshot().statistics("lineno")[:top]
+    return {"current_bytes": current, "peak_bytes": peak,
+            "sites": [{"site": str(site.traceback), "bytes": site.size, "blocks": site.count}
+                      for site in sites]}
+
+def write_report(report):
+    path = os.environ.get(REPORT_ENV, "instrument.json")
+    with open(path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+
+    print("\n%s: %.3fs" % (", ".join(report["modes"]), report["seconds"]))
+    for stage, entry in sorted(report.get("stages", {}).items(), key = lambda item: -item[1]["seconds"]):
+        print("  %-12s %10d calls %10.3fs" % (stage, entry["calls"], entry["seconds"]))
+    if "tracemalloc" in report:
+        print("  peak traced memory %.1f KiB" % (report["tracemalloc"]["peak_bytes"] / 1024))
+    print("report written to %s" % path)
@@ -3,9 +3,11 @@ import json, sys
 from pprint import pprint
 
 class Analysis():
-    def __init__(self):
+    # path is the directory of bill JSON to load, or None to start out empty
+    def __init__(self, path = "data"):
         self.feature_dict = {}
-        self.populateFeatureDict()
+        if path is not None:
+            self.populateFeatureDict(path)
 
     def loadFile(self, path = 'bills/hconres/hconres1/data.json' ):
         with open(path) as data_file:
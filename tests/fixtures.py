@@ -0,0 +1,82 @@
+import contextlib, io, json, os, random
+
+# A small data/ directory laid out like the GovTrack downloads the scripts
+# read: data/bills_<congress>/<type>/<type><number>/data.json and
+# data/votes_<congress>/<year>/<chamber><number>/data.json. Everything comes
+# from a seeded random.Random, so the same seed always writes the same files.
+
+SUBJECTS = ["Agriculture", "Armed forces", "Commerce", "Crime", "Education", "Energy",
+            "Environment", "Finance", "Health", "Immigration", "Labor", "Taxation"]
+SPONSORS = ["Smith, John", "Jones, Mary", "Brown, Ann", "Davis, Paul", "Miller, Sue", "Wilson, Tom"]
+VOTERS = ["V%06d" % i for i in range(15)]
+CONGRESSES = [111, 112, 113]
+BILLS = 30
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, "w") as data_file:
+        json.dump(data, data_file)
+
+def bill_path(root, congress, bill_type, number):
+    return os.path.join(root, "data", "bills_%d" % congress, bill_type, "%s%d" % (bill_type, number), "data.json")
+
+# Writes the bills and roll calls under root/data. Every congress gets BILLS
+# hr bills and a few s bills; hr1 has no subjects. Roll call n is about hr n,
+# which is the bill the scripts look up for it; the last one names a bill that
+# doesn't exist. The vice president's tie breaker is a bare "VP" in one roll
+# call. Voters lean one way on each subject, so the votes can be learned
+def write_govtrack(root, seed = 0):
+    rng = random.Random(seed)
+    leans = {(voter, subject): rng.random() for voter in VOTERS for subject in SUBJECTS}
+
+    for congress in CONGRESSES:
+        for bill_type, count in (("hr", BILLS), ("s", 5)):
+            for number in range(1, count + 1):
+                data = {
+                    "bill_id": "%s%d-%d" % (bill_type, number, congress),
+                    "bill_type": bill_type,
+                    "number": str(number),
+                    "sponsor": {"name": rng.choice(SPONSORS), "state": "XX"},
+                    "status": "ENACTED:SIGNED" if rng.random() < 0.3 else "REFERRED",
+                }
+                if (bill_type, number) != ("hr", 1):
+                    data["subjects"] = rng.sample(SUBJECTS, rng.randint(1, 4))
+                write_json(bill_path(root, congress, bill_type, number), data)
+
+        for number in range(1, BILLS + 2):
+            subjects = set(rng.sample(SUBJECTS, 3))
+            votes = {"Yea": [], "Nay": [], "Not Voting": []}
+            for voter in VOTERS:
+                if rng.random() < 0.1:
+                    status = "Not Voting"
+                else:
+                    lean = sum(leans[voter, subject] for subject in subjects) / len(subjects)
+                    status = "Yea" if rng.random() < lean else "Nay"
+                votes[status].append({"id": voter, "display_name": voter, "party": "X", "state": "XX"})
+            if number == 7:
+                votes["Yea"].insert(2, "VP")
+
+            write_json(os.path.join(root, "data", "votes_%d" % congress, str(2000 + congress), "h%d" % number, "data.json"), {
+                "bill": {"congress": congress, "type": "hr", "number": rng.randint(1, BILLS)},
+                "number": number,
+                "chamber": "h",
+                "category": "passage",
+                "votes": votes,
+            })
+
+# runs fn with its progress messages swallowed
+def quietly(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+# feature -> category -> count, and category -> count, whatever the feature
+# ids, leaving out what has been taken back to 0
+def counts(predictor):
+    features = {f: {cat: column[fid] for cat, column in predictor.fc.items() if column[fid]}
+                for f, fid in predictor.fids.items()}
+    return {f: cats for f, cats in features.items() if cats}, dict(predictor.cc)
+
+# everything the predictions depend on, feature ids and category order included
+def layout(predictor):
+    return (predictor.flist, list(predictor.cc.items()), list(predictor.ft),
+            [(cat, list(column)) for cat, column in predictor.fc.items()], predictor.total)
@@ -0,0 +1,388 @@
+import json, math, os
+from math import sqrt
+
+# The naive bayes classifier as bayes_bills.py, bayes_bills_distilled.py and
+# bayes_votes.py each carried a copy of it before the engine moved into
+# bayesian_classifer/classifier.py, kept here so the tests can check that the
+# shared engine still gives the answers the copies gave. Only the way the
+# copies differed is parameterised: see billsbayes, distilledbayes and votesbayes.
+
+class classifier:
+    def __init__(self, getfeatures, filename=None):
+        # Counts of feature/category combinations
+        self.fc = {}
+        # Counts of documents in each category
+        self.cc = {}
+        self.getfeatures = getfeatures
+
+    # Increase the count of a feature/category pair
+    def incf(self,f,cat):
+        self.fc.setdefault(f,{})
+        self.fc[f].setdefault(cat,0)
+        self.fc[f][cat]+=1
+
+    # Increase the count of a category
+    def incc(self,cat):
+        self.cc.setdefault(cat,0)
+        self.cc[cat]+=1
+
+    # The number of times a feature has appeared in a category
+    def fcount(self,f,cat):
+        if f in self.fc and cat in self.fc[f]:
+            return float(self.fc[f][cat])
+        return 0.0
+
+    # The number of items in a category
+    def catcount(self,cat):
+        if cat in self.cc:
+            return float(self.cc[cat])
+        return 0
+
+    # The total number of items
+    def totalcount(self):
+        return sum(self.cc.values())
+
+    # The list of all categories
+    def categories(self):
+        return self.cc.keys()
+
+    def train(self,item, cat):
+        features = self.getfeatures(item)
+        # Increment the count for every feature with this category
+        for f in features:
+            self.incf(f,cat)
+
+        # Increment the count for this category
+        self.incc(cat)
+
+    def fprob(self,f,cat):
+        if self.catcount(cat)==0: return 0
+
+        # The total number of times this feature appeared in this
+        # category divided by the total number of items in this category
+        return self.fcount(f,cat)/self.catcount(cat)
+
+    def weightedprob(self,f,cat,prf,weight=1.0,ap=0.5):
+        # Calculate current probability
+        basicprob=prf(f,cat)
+
+        # Count the number of times this feature has appeared in
+        # all categories
+        totals=sum([self.fcount(f,c) for c in self.categories()])
+
+        # Calculate the weighted average
+        bp=((weight*ap)+(totals*basicprob))/(weight+totals)
+        return bp
+
+class naivebayes(classifier):
+    def __init__(self,getfeatures):
+        classifier.__init__(self, getfeatures)
+        self.thresholds={}
+
+    def features(self,item):
+        return self.getfeatures(item)
+
+    def docprob(self,item,cat):
+        features = self.features(item)
+
+        # Multiply the probabilities of all the features together
+        p = 1
+        for f in features: p += math.log(self.weightedprob(f,cat,self.fprob))
+        return -1*p
+
+    def prob(self,item,cat):
+        catprob = self.catcount(cat)/self.totalcount()
+        docprob = self.docprob(item,cat)
+        return 100.0 - (docprob * catprob)
+
+    def setthreshold(self,cat,t):
+        self.thresholds[cat]=t
+
+    def getthreshold(self,cat):
+        if cat not in self.thresholds: return 1.0
+        return self.thresholds[cat]
+
+    def answer(self,best):
+        return best
+
+    def classify(self,item,default = None):
+        probs={}
+        # Find the category with the highest probability
+
+        max = 0.0
+        for cat in self.categories():
+          probs[cat] = self.prob(item,cat)
+          if probs[cat] > max:
+            max = probs[cat]
+            best = cat
+        for cat in probs:
+          if cat==best: continue
+          if probs[cat]*self.getthreshold(best)>probs[best]: return default
+        return self.answer(best)
+
+# bayes_bills.py: getfeatures returns (features, status) and train takes the
+# category from it, best starts out as category 0 and the answer is flipped
+class billsbayes(naivebayes):
+    def features(self,item):
+        return self.getfeatures(item)[0]
+
+    def train(self,item):
+        features, cat = self.getfeatures(item)
+        for f in features:
+            self.incf(f,cat)
+        self.incc(cat)
+
+    def classify(self,item,default = None):
+        probs={}
+        max = 0.0
+        best = 0
+        for cat in self.categories():
+          probs[cat] = self.prob(item,cat)
+          if probs[cat] > max:
+            max = probs[cat]
+            best = cat
+        for cat in probs:
+          if cat==best: continue
+          if probs[cat]*self.getthreshold(best)>probs[best]: return default
+        return 1 - best
+
+# bayes_bills_distilled.py: the answer is flipped, and an item where no
+# category is positive raises (and the bill was skipped)
+class distilledbayes(naivebayes):
+    def answer(self,best):
+        return 1 - best
+
+# bayes_votes.py: the category as is, raising like the distilled copy
+class votesbayes(naivebayes):
+    pass
+
+def process_states_simple(status):
+    return 1 if "ENACTED" in status else 0
+
+# bayes_bills.getBillFeatures
+def getBillFeatures(billPath):
+    feature_dict = {}
+    status = ""
+    with open(billPath) as data_file:
+        data = json.load(data_file)
+
+        try:
+            status = process_states_simple(data["status"])
+
+            for subject in data["subjects"]:
+                feature_dict[subject] = status
+            feature_dict[data["sponsor"]["name"]] = status
+        except: pass
+
+    return feature_dict, status
+
+def trainForCongress(predictor, billPath):
+    for path, dirs, files in os.walk(billPath):
+        for data_file in files:
+            if ".json" in data_file:
+                predictor.train(path + "/" + data_file)
+
+# (bill path, predicted, actual) for every bill under billPath
+def predictBills(predictor, billPath, default = None):
+    results = []
+    for path, dirs, files in os.walk(billPath):
+        for data_file in files:
+            bill = path + "/" + data_file
+            results.append((bill, predictor.classify(bill, default), predictor.getfeatures(bill)[1]))
+    return results
+
+# bayes_bills_distilled.get_features
+def get_features(data):
+    sponsor = data[0]
+    subjects = data[1]
+
+    features = {}
+    for subject in subjects:
+        features[subject] = 1
+    features[sponsor] = 1
+
+    return features
+
+def train_with_distilled(predictor, input_csv):
+    with open(input_csv, "r") as csv_file:
+        for line in csv_file.readlines():
+            try:
+                row = line.split("\t")
+                sponsor = row[0]
+                result = int(row[1])
+                subjects = row[2][:-1].split("|")
+                predictor.train([sponsor, subjects], result)
+            except:
+                pass
+
+# (predicted, actual) for every bill of a distilled file the copy counted
+def predict_distilled(predictor, input_csv, default = None):
+    results = []
+    with open(input_csv, "r") as csv_file:
+        for line in csv_file.readlines():
+            try:
+                row = line.split("\t")
+                sponsor = row[0]
+                result = int(row[1])
+                subjects = row[2][:-1].split("|")
+                results.append((predictor.classify([sponsor, subjects], default), result))
+            except:
+                pass
+    return results
+
+# bayes_votes.getVoteFeatures
+def getVoteFeatures(vote_data):
+    feature_dict = {}
+    voter = vote_data[0]["id"]
+    subject = vote_data[1]
+
+    feature_dict[(voter, subject)] = 1
+
+    return feature_dict
+
+def group(status):
+    return 1 if (status == "Aye" or status == "Yea") else 0
+
+def rollCallBill(vote_data):
+    billPath = "data/bills_%d/%s/%s%d/data.json" % (
+        vote_data["bill"]["congress"],
+        vote_data["bill"]["type"],
+        vote_data["bill"]["type"],
+        vote_data["number"] )
+    with open(billPath) as bill_file:
+        return json.load(bill_file)
+
+def parseFeatures(predictor, votePath):
+    with open(votePath) as vote_file:
+        vote_data = json.load(vote_file)
+
+        try:
+            bill_data = rollCallBill(vote_data)
+            for status in vote_data["votes"].keys():
+                for vote in vote_data["votes"][status]:
+                    for subject in bill_data["subjects"]:
+                        predictor.train((vote, subject), group(status))
+        except:
+            pass
+
+def trainPredictor(predictor, votePath):
+    for path, dirs, files in os.walk(votePath):
+        for data_file in files:
+            if ".json" in data_file:
+                parseFeatures(predictor, path + "/" + data_file)
+
+# [correct, predictions] over every roll call under votePath, with the
+# (vote file, predicted, actual) of every vote and subject in results
+def predictOutcomes(predictor, votePath, results = None, default = None):
+    accuracy = [0,0]
+    for path, dirs, files in os.walk(votePath):
+        for data_file in files:
+            if ".json" in data_file:
+                with open(path + "/" + data_file) as vote_file:
+                    vote_data = json.load(vote_file)
+
+                    try:
+                        bill_data = rollCallBill(vote_data)
+                        for status in vote_data["votes"].keys():
+                            for vote in vote_data["votes"][status]:
+                                for subject in bill_data["subjects"]:
+                                    predicted = predictor.classify((vote, subject), default)
+                                    if results is not None:
+                                        results.append((path + "/" + data_file, predicted, group(status)))
+                                    accuracy[0] += predicted == group(status)
+                                    accuracy[1] += 1
+                    except:
+                        pass
+
+    return accuracy
+
+# collab_filter.py's similarity functions, topMatches, getRecommendations and
+# calculateSimilarItems before calculateSimilarItems went through the sparse
+# item x user matrix and topMatches through heapq
+
+# Returns a distance-based similarity score for person1 and person2
+def sim_distance(prefs, person1, person2 ):
+    si={}
+    for item in prefs[person1]:
+      if item in prefs[person2]: si[item]=1
+
+    if len(si)==0: return 0
+
+    sum_of_squares=sum([pow(prefs[person1][item]-prefs[person2][item],2)
+                        for item in prefs[person1] if item in prefs[person2]])
+
+    return 1/(1+sum_of_squares)
+
+# Returns the Pearson correlation coefficient for p1 and p2
+def sim_pearson(prefs, p1, p2 ):
+  si={}
+  for item in prefs[p1]:
+    if item in prefs[p2]: si[item]=1
+
+  if len(si)==0: return 0
+
+  n=len(si)
+
+  sumX=sum([prefs[p1][it] for it in si])
+  sumY=sum([prefs[p2][it] for it in si])
+
+  sumXSq=sum([pow(prefs[p1][it],2) for it in si])
+  sumYSq=sum([pow(prefs[p2][it],2) for it in si])
+
+  sumXY=sum([prefs[p1][it]*prefs[p2][it] for it in si])
+
+  num=sumXY-(sumX*sumY/n)
+  try:
+    den=sqrt((sumXSq-pow(sumX,2)/n)*(sumYSq-pow(sumY,2)/n))
+    if den==0: return 0
+  except:
+    return 0
+
+  r=num/den
+
+  return r
+
+def topMatches(prefs, person, n=5, similarity=sim_pearson ):
+  scores=[(similarity(prefs,person,other),other)
+                  for other in prefs if other!=person]
+  scores.sort()
+  scores.reverse()
+  return scores[0:n]
+
+def getRecommendations(prefs, person, similarity=sim_pearson ):
+  totals={}
+  simSums={}
+  for other in prefs:
+    if other==person: continue
+    sim=similarity(prefs,person,other)
+
+    if sim<=0: continue
+    for item in prefs[other]:
+
+      if item not in prefs[person] or prefs[person][item]==0:
+        totals.setdefault(item,0)
+        totals[item]+=prefs[other][item]*sim
+        simSums.setdefault(item,0)
+        simSums[item]+=sim
+
+  rankings=[(total/simSums[item],item) for item,total in totals.items()]
+
+  rankings.sort()
+  rankings.reverse()
+  return rankings
+
+def transformPrefs(prefs ):
+  result={}
+  for person in prefs:
+    for item in prefs[person]:
+      result.setdefault(item,{})
+      result[item][person]=prefs[person][item]
+  return result
+
+# the similarity is a parameter here, the original always used sim_pearson
+def calculateSimilarItems(prefs, n=10, similarity=sim_pearson ):
+    result={}
+    itemPrefs = transformPrefs( prefs )
+    for item in itemPrefs:
+      result[item] = topMatches( itemPrefs, item, n=n, similarity=similarity )
+    return result
@@ -0,0 +1,129 @@
+import json, os, shutil, sqlite3, sys, tempfile, unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import bayes_bills
+from classifier import naivebayes, classifyparallel
+
+from fixtures import write_govtrack, write_json, bill_path, quietly
+
+# The parsed bills BillCache keeps in memory and in its SQLite file, and when
+# it has to parse a bill again.
+
+parsed = []
+
+# parseBill, recording which bills it was asked for
+def countingParse(billPath, parse = bayes_bills.parseBill):
+    parsed.append(billPath)
+    return parse(billPath)
+
+# the same with a change to the features it gives
+def subjectlessParse(billPath, parse = bayes_bills.parseBill):
+    parsed.append(billPath)
+    features, status = parse(billPath)
+    return {}, status
+
+class BillCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        write_govtrack(self.root)
+        self.database = os.path.join(self.root, "bill_features.db")
+        self.bills = [bill_path(self.root, 111, "hr", number) for number in range(1, 11)]
+        del parsed[:]
+
+        patcher = mock.patch.object(bayes_bills, "parseBill", countingParse)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cache(self, size = 50000):
+        cache = bayes_bills.BillCache(size)
+        cache.persist(self.database)
+        return cache
+
+    def stored(self):
+        with sqlite3.connect(self.database) as db:
+            return dict((path, (mtime, json.loads(row))) for path, mtime, row in db.execute("select * from bills"))
+
+    def test_lru(self):
+        cache = bayes_bills.BillCache(size = 3)
+        for bill in self.bills[:3]: cache.get(bill)
+        cache.get(self.bills[0])
+        cache.get(self.bills[3])
+        self.assertEqual(list(cache.entries), [self.bills[2], self.bills[0], self.bills[3]])
+
+        del parsed[:]
+        for bill in (self.bills[0], self.bills[3], self.bills[1]): cache.get(bill)
+        self.assertEqual(parsed, [self.bills[1]])
+
+    def test_modified_bills_are_parsed_again(self):
+        cache = self.cache()
+        before = cache.get(self.bills[4])
+        self.assertEqual(cache.get(self.bills[4]), before)
+        self.assertEqual(parsed, [self.bills[4]])
+
+        with open(self.bills[4]) as bill_file:
+            data = json.load(bill_file)
+        data["subjects"] = ["Something new"]
+        write_json(self.bills[4], data)
+        os.utime(self.bills[4], ns = (os.stat(self.bills[4]).st_atime_ns, os.stat(self.bills[4]).st_mtime_ns + 10**9))
+
+        after = cache.get(self.bills[4])
+        self.assertEqual(parsed, [self.bills[4]]*2)
+        self.assertIn("Something new", after[0])
+        cache.flush()
+        self.assertEqual(self.stored()[self.bills[4]], (os.stat(self.bills[4]).st_mtime_ns, list(after)))
+
+    # parsed bills are written by flush, and a new process reads them back
+    def test_persisted(self):
+        cache = self.cache()
+        expected = [cache.get(bill) for bill in self.bills]
+        self.assertEqual(self.stored(), {})
+        cache.flush()
+        self.assertEqual(len(self.stored()), len(self.bills))
+
+        del parsed[:]
+        self.assertEqual([self.cache().get(bill) for bill in self.bills], expected)
+        self.assertEqual(parsed, [])
+
+    def test_wiped_when_the_parser_changes(self):
+        cache = self.cache()
+        for bill in self.bills: cache.get(bill)
+        cache.flush()
+
+        del parsed[:]
+        with mock.patch.object(bayes_bills, "parseBill", subjectlessParse):
+            cache = self.cache()
+            self.assertEqual([cache.get(bill)[0] for bill in self.bills], [{}]*len(self.bills))
+            self.assertEqual(parsed, self.bills)
+            self.assertEqual(self.stored(), {})
+
+    # every pool worker writes the bills of its shards to the file
+    def test_training_fills_the_file(self):
+        patcher = mock.patch.object(bayes_bills, "billCache", self.cache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        bills = os.path.join(self.root, "data", "bills_112")
+        quietly(bayes_bills.trainForCongress, naivebayes(bayes_bills.getBillSubjects), bills, processes = 2)
+        self.assertEqual(len(self.stored()), 35)
+        self.assertTrue(all(path.startswith(bills) for path in self.stored()))
+
+    def test_classifying_fills_the_file(self):
+        patcher = mock.patch.object(bayes_bills, "billCache", self.cache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        model = os.path.join(self.root, "predictor.model")
+        predictor = naivebayes(bayes_bills.getBillSubjects, flip=True)
+        bayes_bills.trainBillFiles(predictor, self.bills)
+        predictor.save(model)
+
+        bills = [bill_path(self.root, 113, "hr", number) for number in range(1, 21)]
+        classifyparallel(model, bayes_bills.getBillSubjects, bills, bayes_bills.getBillFeatures, 2,
+                         chunk = 3, finish = bayes_bills.flushBills)
+        self.assertEqual(sorted(self.stored()), sorted(self.bills + bills))
+
+if __name__ == "__main__":
+    unittest.main()
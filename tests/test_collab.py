@@ -0,0 +1,99 @@
+import os, random, sys, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "collab_filter"))
+
+import collab_filter
+import original
+
+from fixtures import quietly
+
+# calculateSimilarItems through the sparse item x user matrix against the old
+# one, which ran topMatches over every pair of items, on seeded synthetic
+# ratings: whole-number ratings so scores tie, and sparse enough that some
+# items share no users with others.
+
+def synthetic_prefs(seed, users, items, density, ratings=None):
+    rng = random.Random(seed)
+    prefs = {}
+    for user in range(users):
+        prefs["user%d" % user] = dict(("item%d" % item, rng.choice(ratings) if ratings else rng.random())
+                                      for item in range(items) if rng.random() < density)
+    return prefs
+
+DATASETS = [synthetic_prefs(0, 80, 200, 0.3),
+            synthetic_prefs(1, 40, 150, 0.05, ratings=[1, 2, 3, 4, 5]),
+            synthetic_prefs(2, 30, 60, 0.2, ratings=[1.0, 3.0, 5.0])]
+
+class SimilarItemsTest(unittest.TestCase):
+    def test_matches_topmatches(self):
+        for prefs in DATASETS:
+            for similarity, old in ((collab_filter.sim_pearson, original.sim_pearson),
+                                    (collab_filter.sim_distance, original.sim_distance)):
+                for n in (1, 10, 500):
+                    self.assertEqual(quietly(collab_filter.calculateSimilarItems, prefs, n, similarity),
+                                     original.calculateSimilarItems(prefs, n, old))
+
+    # the sparse datasets really do have items sharing no users, and ties
+    def test_datasets(self):
+        itemPrefs = original.transformPrefs(DATASETS[1])
+        scores = original.topMatches(itemPrefs, "item0", n=len(itemPrefs))
+        self.assertIn(0, [score for score, other in scores])
+        self.assertLess(len(set(score for score, other in scores if score != 0)),
+                        len([score for score, other in scores if score != 0]))
+
+    # without an index topMatches and getRecommendations are the old ones
+    def test_exact(self):
+        prefs = DATASETS[0]
+        for person in ("user0", "user7", "user33"):
+            self.assertEqual(collab_filter.topMatches(prefs, person, n=10),
+                             original.topMatches(prefs, person, n=10))
+            self.assertEqual(collab_filter.getRecommendations(prefs, person),
+                             original.getRecommendations(prefs, person))
+
+class LSHIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.prefs = DATASETS[0]
+        self.people = ("user0", "user7", "user33")
+
+    # with no hyperplanes everyone shares one bucket, so nothing is approximate
+    def test_one_bucket(self):
+        index = collab_filter.LSHIndex(self.prefs, bits=0)
+        for person in self.people:
+            self.assertEqual(index.candidates(self.prefs[person]), list(self.prefs))
+            self.assertEqual(collab_filter.topMatches(self.prefs, person, n=10, index=index),
+                             collab_filter.topMatches(self.prefs, person, n=10))
+            self.assertEqual(collab_filter.getRecommendations(self.prefs, person, index=index),
+                             collab_filter.getRecommendations(self.prefs, person))
+
+    def test_candidates_in_prefs_order(self):
+        index = collab_filter.LSHIndex(self.prefs, tables=4, bits=4)
+        order = list(self.prefs)
+        for person in self.people:
+            candidates = index.candidates(self.prefs[person])
+            self.assertIn(person, candidates)
+            self.assertLess(len(candidates), len(order))
+            self.assertEqual(candidates, [other for other in order if other in candidates])
+
+    def test_seeded(self):
+        def build(seed):
+            index = collab_filter.LSHIndex(self.prefs, seed=seed)
+            return index.weights, index.buckets
+        self.assertEqual(build(3), build(3))
+        self.assertNotEqual(build(3), build(4))
+
+    # probing the neighbouring buckets only adds candidates
+    def test_probes(self):
+        exact = collab_filter.LSHIndex(self.prefs, tables=4, bits=6, probes=0, seed=5)
+        probed = collab_filter.LSHIndex(self.prefs, tables=4, bits=6, probes=1, seed=5)
+        grew = False
+        for person in self.prefs:
+            candidates = set(exact.candidates(self.prefs[person]))
+            more = set(probed.candidates(self.prefs[person]))
+            self.assertLessEqual(candidates, more)
+            grew = grew or candidates < more
+        self.assertTrue(grew)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os, shutil, sys, tempfile, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import bayes_bills_distilled
+from helpers.columnar import Columnar, tsv_to_columnar, columnar_path
+
+# The columnar copy of a distilled file reads back as the same rows as the tab
+# separated file, whole and in shards.
+
+DISTILLED = os.path.join(ROOT, "data_distilled", "data_distilled_%d.csv")
+
+# two of the bills have no subjects, so they were distilled with two columns
+LINES = ["Smith, John\t1\tTaxation|Health\n",
+         "Jones, Mary\t0\n",
+         "Brown, Ann\t0\tEducation\n",
+         "Smith, John\t0\tHealth|Crime|Energy\n",
+         "Davis, Paul\t1\tEnergy\n",
+         "Jones, Mary\t1\n"]
+
+def read(path, start = 0, end = None):
+    skipped = []
+    rows = list(bayes_bills_distilled.read_distilled(path, skipped, start, end))
+    return rows, skipped
+
+class ColumnarTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def columnar(self, tsv):
+        col = os.path.join(self.root, os.path.basename(columnar_path(tsv)))
+        tsv_to_columnar(tsv, col)
+        return col
+
+    # the rows of every shard, one after the other
+    def sharded(self, path, count):
+        shards = bayes_bills_distilled.distilled_shards(path, count)
+        self.assertEqual([shard[1] for shard in shards[1:]], [shard[2] for shard in shards[:-1]])
+        return [row for shard in shards for row in read(*shard)[0]]
+
+    def test_distilled_files(self):
+        for congress in (111, 112, 113):
+            col = self.columnar(DISTILLED % congress)
+            rows, skipped = read(DISTILLED % congress)
+            self.assertEqual(read(col), (rows, skipped))
+            for count in (1, 4, 7):
+                self.assertEqual(self.sharded(col, count), rows)
+
+    def test_bills_without_subjects(self):
+        tsv = os.path.join(self.root, "distilled.csv")
+        with open(tsv, "w") as tsv_file:
+            tsv_file.writelines(LINES)
+        col = self.columnar(tsv)
+
+        self.assertEqual(len(Columnar(col)), len(LINES))
+        self.assertEqual(list(Columnar(col).rows())[1], ("Jones, Mary", 0, []))
+        rows, skipped = read(tsv)
+        self.assertEqual(skipped, [2, 6])
+        self.assertEqual(read(col), (rows, skipped))
+        self.assertEqual(len(rows), 4)
+
+        # shards of one bill each, and more shards than bills
+        for count in (1, 2, 3, len(LINES), 10):
+            shards = bayes_bills_distilled.distilled_shards(col, count)
+            self.assertEqual(sum(end - start for path, start, end in shards), len(LINES))
+            self.assertEqual(self.sharded(col, count), rows)
+            self.assertEqual(self.sharded(tsv, count), rows)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os, random, sys, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import crossval
+from classifier import naivebayes
+
+# crossvalidation.sweep against what it stands in for: a naivebayes model
+# trained on the rest of every fold with the weight and ap, the threshold set
+# for every category, and each held-out row classified with it.
+
+DISTILLED = os.path.join(ROOT, "data_distilled", "data_distilled_%d.csv")
+
+CONFIGS = dict(weights = (0.5, 1.0, 4.0), aps = (0.2, 0.5, 0.9), thresholds = (0.0, 1.0, 1.001, 1.05))
+
+def features(item):
+    return item
+
+def retrained(rows, folds, flip, weight, ap, t):
+    correct = 0
+    for fold in set(folds):
+        predictor = naivebayes(features, flip=flip, weight=weight, ap=ap)
+        for (rowfeatures, cat), rowfold in zip(rows, folds):
+            if rowfold != fold: predictor.train(rowfeatures, cat)
+        for cat in predictor.categories():
+            predictor.setthreshold(cat, t)
+        predictor.compile()
+        for (rowfeatures, cat), rowfold in zip(rows, folds):
+            if rowfold == fold: correct += predictor.classifyfeatures(rowfeatures) == cat
+    return float(correct)/len(rows)
+
+# rows over three categories where category 2 only turns up in the last
+# tenth, so some folds are trained without it
+def synthetic_rows(seed, count):
+    rng = random.Random(seed)
+    words = ["w%d" % i for i in range(40)]
+    rows = []
+    for i in range(count):
+        cat = 2 if i >= count*9//10 and rng.random() < 0.5 else rng.choice((0, 1))
+        rows.append(({word: 1 for word in rng.sample(words[cat*10:cat*10 + 25], rng.randint(0, 4))}, cat))
+    return rows
+
+class SweepTest(unittest.TestCase):
+    def assertSweepMatches(self, rows, folds, flip):
+        results = crossval.crossvalidation(rows, folds, flip=flip).sweep(**CONFIGS)
+        self.assertEqual(len(results), 36)
+        self.assertEqual([result[0] for result in results], sorted((result[0] for result in results), reverse=True))
+        for accuracy, weight, ap, t in results:
+            self.assertEqual(accuracy, retrained(rows, folds, flip, weight, ap, t), (weight, ap, t))
+
+    def distilled(self):
+        paths = [DISTILLED % 111, DISTILLED % 112]
+        rows, folds = crossval.distilled_rows(paths)
+        # the first 300 bills of each congress, and one with no features
+        starts = {fold: folds.index(fold) for fold in paths}
+        keep = [i for i, fold in enumerate(folds) if i - starts[fold] < 300]
+        rows = [rows[i] for i in keep] + [({}, 0)]
+        folds = [folds[i] for i in keep] + [paths[0]]
+        return rows, folds
+
+    def test_congress_hold_out(self):
+        self.assertSweepMatches(*self.distilled(), flip=True)
+
+    def test_k_fold(self):
+        rows, folds = self.distilled()
+        self.assertSweepMatches(rows, [i % 4 for i in range(len(rows))], flip=True)
+
+    def test_categories_missing_from_a_fold(self):
+        rows = synthetic_rows(0, 300)
+        self.assertIn(({}, 0), rows)
+        self.assertSweepMatches(rows, [i % 5 for i in range(len(rows))], flip=False)
+        self.assertSweepMatches(rows, [i*3 // len(rows) for i in range(len(rows))], flip=False)
+
+    def test_negative_threshold(self):
+        rows = synthetic_rows(1, 50)
+        with self.assertRaises(ValueError):
+            crossval.crossvalidation(rows, [i % 2 for i in range(50)]).sweep(thresholds = (-1.0,))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import contextlib, io, json, os, shutil, sys, tempfile, unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+from helpers import distill
+
+from fixtures import write_govtrack, write_json, bill_path
+
+# Running distill_1NF again only parses the bills that are new or changed
+# since the manifest was written, unless the row parser itself changed.
+
+# distill_1NF_row with a change to the rows it gives
+def first_subject_row(bill_path, distill_row = distill.distill_1NF_row):
+    row = distill_row(bill_path)
+    return row and row.split("|")[0]
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        write_govtrack(self.root)
+        self.bills = os.path.join(self.root, "data", "bills_111")
+        self.out = os.path.join(self.root, "distilled_111.csv")
+
+    # the message distill_1NF printed, and the rows it wrote
+    def distill(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            distill.distill_1NF(self.bills, self.out, 1)
+        with open(self.out) as distilled:
+            return output.getvalue().strip(), distilled.read().splitlines()
+
+    def manifest(self):
+        with open(self.out + ".manifest") as manifest_file:
+            return json.load(manifest_file)
+
+    def test_unchanged(self):
+        message, rows = self.distill()
+        self.assertEqual(message, "distilled 35 bills, 35 of them parsed this run")
+        self.assertEqual(self.distill(), ("distilled 35 bills, 0 of them parsed this run", rows))
+
+    def test_touched_bill(self):
+        message, rows = self.distill()
+        path = bill_path(self.root, 111, "hr", 5)
+        with open(path) as bill_file:
+            data = json.load(bill_file)
+        data["subjects"] = ["Something new"]
+        write_json(path, data)
+        os.utime(path, ns = (os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+
+        message, touched = self.distill()
+        self.assertEqual(message, "distilled 35 bills, 1 of them parsed this run")
+        changed = [(before, after) for before, after in zip(rows, touched) if before != after]
+        self.assertEqual(len(changed), 1)
+        self.assertTrue(changed[0][1].endswith("\tSomething new"))
+        self.assertEqual(self.manifest()["bills"][path], [os.stat(path).st_mtime_ns, changed[0][1]])
+
+    def test_deleted_bill(self):
+        message, rows = self.distill()
+        path = bill_path(self.root, 111, "hr", 5)
+        row = self.manifest()["bills"][path][1]
+        os.remove(path)
+
+        message, remaining = self.distill()
+        self.assertEqual(message, "distilled 34 bills, 0 of them parsed this run")
+        rows.remove(row)
+        self.assertEqual(remaining, rows)
+        self.assertNotIn(path, self.manifest()["bills"])
+
+    def test_parser_changed(self):
+        message, rows = self.distill()
+        with mock.patch.object(distill, "distill_1NF_row", first_subject_row):
+            message, changed = self.distill()
+        self.assertEqual(message, "distilled 35 bills, 35 of them parsed this run")
+        self.assertEqual(changed, [row.split("|")[0] for row in rows])
+
+        message, restored = self.distill()
+        self.assertEqual((message, restored), ("distilled 35 bills, 35 of them parsed this run", rows))
+
+if __name__ == "__main__":
+    unittest.main()
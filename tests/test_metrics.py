@@ -0,0 +1,55 @@
+import os, random, sys, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import bayes_bills_distilled
+import metrics
+from classifier import naivebayes
+
+DISTILLED = os.path.join(ROOT, "data_distilled", "data_distilled_%d.csv")
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.scores = [round(rng.random(), 2) for i in range(300)]
+        self.actual = [int(rng.random() < score) for score in self.scores]
+
+    # every row is what predicting positive for the scores at or above its
+    # cut-off, and negative for the rest, gives
+    def test_table_is_a_plain_cut_off(self):
+        table = metrics.threshold_table(self.scores, self.actual)
+        self.assertEqual(len(table), len(set(self.scores)))
+        for s, tp, fp, fn, tn, precision, recall, f1, accuracy in table:
+            predicted = [score >= s for score in self.scores]
+            pairs = list(zip(predicted, self.actual))
+            self.assertEqual((tp, fp, fn, tn), (pairs.count((True, 1)), pairs.count((True, 0)),
+                                                pairs.count((False, 1)), pairs.count((False, 0))))
+            self.assertAlmostEqual(accuracy, float(tp + tn) / len(self.scores))
+
+    def test_roc_auc(self):
+        positives = [s for s, a in zip(self.scores, self.actual) if a]
+        negatives = [s for s, a in zip(self.scores, self.actual) if not a]
+        pairs = sum(1.0 if p > n else 0.5 if p == n else 0.0 for p in positives for n in negatives)
+        self.assertAlmostEqual(metrics.roc_auc(self.scores, self.actual), pairs / (len(positives) * len(negatives)))
+
+    # a cut-off below 1 is not something setthreshold can do: the threshold
+    # of the enacted category only matters for bills it already wins
+    def test_cut_offs_are_not_thresholds(self):
+        predictor = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        for congress in (111, 112):
+            bayes_bills_distilled.train_with_distilled(predictor, DISTILLED % congress)
+        predictor.compile()
+        rows = list(bayes_bills_distilled.read_distilled(DISTILLED % 113))[:2000]
+        probs, actual = bayes_bills_distilled.score_rows(predictor, rows)
+        scores = bayes_bills_distilled.enacted_scores(predictor, probs)
+        before = [predictor.decide(bill_probs) for bill_probs in probs]
+        self.assertEqual(before, [1 if score > 1 else 0 for score in scores])
+
+        enacted = [cat for cat in predictor.categories() if 1 - cat == 1][0]
+        predictor.setthreshold(enacted, 0.5)
+        self.assertEqual([predictor.decide(bill_probs) for bill_probs in probs], before)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import itertools, os, shutil, sys, tempfile, unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import bayes_bills
+import bayes_bills_distilled
+from classifier import naivebayes, cached, extractorid, load, applydelta
+
+from fixtures import counts
+
+# Saved models and when cached() reuses them.
+
+DISTILLED = os.path.join(ROOT, "data_distilled", "data_distilled_%d.csv")
+
+# parse_line and parseBill with a change that shapes the features differently
+def parse_line(line, parse = bayes_bills_distilled.parse_line):
+    (sponsor, subjects), result = parse(line)
+    return [sponsor, subjects[:1]], result
+
+def parseBill(billPath, parse = bayes_bills.parseBill):
+    features, status = parse(billPath)
+    return {}, status
+
+class CachedTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.model = os.path.join(self.root, "distilled.model")
+        self.inputs = []
+        for congress in (111, 112):
+            self.inputs.append(os.path.join(self.root, "%d.csv" % congress))
+            with open(DISTILLED % congress) as source, open(self.inputs[-1], "w") as out:
+                out.writelines(itertools.islice(source, 200))
+
+    def cached(self):
+        return cached(self.model, bayes_bills_distilled.get_features, self.inputs,
+                      bayes_bills_distilled.train_with_distilled, flip=True)
+
+    def test_reused(self):
+        predictor, trained = self.cached()
+        self.assertEqual(trained, self.inputs)
+        again, trained = self.cached()
+        self.assertEqual(trained, [])
+        self.assertEqual(again.flist, predictor.flist)
+
+    # the extractor is a one-liner over the parsed row, so the fingerprint
+    # has to cover the reader that parses the rows
+    def test_retrained_when_the_reader_changes(self):
+        predictor, trained = self.cached()
+        with mock.patch.object(bayes_bills_distilled, "parse_line", parse_line):
+            changed, trained = self.cached()
+        self.assertEqual(trained, self.inputs)
+        self.assertLess(len(changed.flist), len(predictor.flist))
+
+    # a model cut short anywhere is refused, and cached() trains a new one
+    def test_truncated(self):
+        predictor, trained = self.cached()
+        with open(self.model, "rb") as model_file:
+            saved = model_file.read()
+        for length in sorted(set(range(0, len(saved), max(1, len(saved) // 97))) | {len(saved) - 4, len(saved) - 1}):
+            with open(self.model, "wb") as model_file:
+                model_file.write(saved[:length])
+            with self.assertRaises(ValueError):
+                load(self.model, bayes_bills_distilled.get_features)
+
+        again, trained = self.cached()
+        self.assertEqual(trained, self.inputs)
+        self.assertEqual(again.flist, predictor.flist)
+
+    # saving replaces the file, so a model mapped from the old one keeps its counts
+    def test_save_keeps_mapped_models(self):
+        self.cached()
+        mapped = load(self.model, bayes_bills_distilled.get_features)
+        before = counts(mapped)
+        naivebayes(bayes_bills_distilled.get_features, flip=True).save(self.model)
+        self.assertEqual(counts(mapped), before)
+        self.assertFalse(os.path.exists(self.model + ".tmp"))
+
+    def test_extractor_follows_the_bill_parser(self):
+        before = extractorid(bayes_bills.getBillSubjects, bayes_bills.trainForCongress)
+        with mock.patch.object(bayes_bills, "parseBill", parseBill):
+            self.assertNotEqual(extractorid(bayes_bills.getBillSubjects, bayes_bills.trainForCongress), before)
+        self.assertEqual(extractorid(bayes_bills.getBillSubjects, bayes_bills.trainForCongress), before)
+
+class DeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.model = os.path.join(self.root, "distilled.model")
+        self.inputs = {}
+        for congress in (111, 112, 113):
+            self.inputs[congress] = os.path.join(self.root, "%d.csv" % congress)
+            with open(DISTILLED % congress) as source, open(self.inputs[congress], "w") as out:
+                out.writelines(itertools.islice(source, 300))
+
+    def retrained(self, *congresses):
+        predictor = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        for congress in congresses:
+            bayes_bills_distilled.train_with_distilled(predictor, self.inputs[congress])
+        return predictor
+
+    def predictions(self, predictor):
+        predictor.compile()
+        return bayes_bills_distilled.predict_file(predictor, DISTILLED % 113)
+
+    # new features don't fit in the saved columns, so the model is saved again
+    def test_roll_window(self):
+        self.retrained(111, 112).save(self.model)
+        bayes_bills_distilled.roll_window(self.model, added = [self.inputs[113]], dropped = [self.inputs[111]])
+
+        rolled = load(self.model, bayes_bills_distilled.get_features)
+        retrained = self.retrained(112, 113)
+        self.assertEqual(counts(rolled), counts(retrained))
+        self.assertEqual(self.predictions(rolled), self.predictions(retrained))
+        self.assertEqual([trained[0] for trained in rolled.inputs], [self.inputs[113]])
+
+    # without new features only the changed counts are written into the file
+    def test_in_place(self):
+        predictor = self.retrained(111, 112)
+        predictor.save(self.model)
+        size = os.path.getsize(self.model)
+        rows = list(bayes_bills_distilled.read_distilled(self.inputs[111]))[:50]
+        applydelta(self.model, bayes_bills_distilled.get_features, dropped = rows)
+
+        self.assertEqual(os.path.getsize(self.model), size)
+        forgotten = load(self.model, bayes_bills_distilled.get_features)
+        retrained = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        for data, result in list(bayes_bills_distilled.read_distilled(self.inputs[111]))[50:]:
+            retrained.train(data, result)
+        bayes_bills_distilled.train_with_distilled(retrained, self.inputs[112])
+        self.assertEqual(counts(forgotten), counts(retrained))
+        self.assertEqual(self.predictions(forgotten), self.predictions(retrained))
+
+    def test_forgetting_what_was_never_trained(self):
+        self.retrained(111).save(self.model)
+        rows = list(bayes_bills_distilled.read_distilled(self.inputs[112]))
+        with self.assertRaises(ValueError):
+            applydelta(self.model, bayes_bills_distilled.get_features, dropped = rows)
+
+if __name__ == "__main__":
+    unittest.main()
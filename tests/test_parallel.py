@@ -0,0 +1,92 @@
+import os, shutil, sys, tempfile, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import bayes_bills
+import bayes_bills_distilled
+import bayes_votes
+from classifier import naivebayes, classifyparallel
+from helpers.bill_index import bill_index
+
+from fixtures import write_govtrack, quietly, layout
+
+# Training and classifying in a pool of processes gives the same model and the
+# same answers as doing it in this process.
+
+DISTILLED = os.path.join(ROOT, "data_distilled", "data_distilled_%d.csv")
+
+class TrainParallelTest(unittest.TestCase):
+    def test_distilled_shards(self):
+        serial = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        pooled = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        for congress in (111, 112):
+            bayes_bills_distilled.train_with_distilled(serial, DISTILLED % congress)
+            bayes_bills_distilled.train_with_distilled(pooled, DISTILLED % congress, processes = 3)
+        self.assertEqual(layout(pooled), layout(serial))
+
+    def test_bill_shards(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        write_govtrack(root)
+
+        serial = naivebayes(bayes_bills.getBillSubjects, flip=True)
+        pooled = naivebayes(bayes_bills.getBillSubjects, flip=True)
+        for congress in (111, 112):
+            path = os.path.join(root, "data", "bills_%d" % congress)
+            quietly(bayes_bills.trainForCongress, serial, path, processes = 1)
+            quietly(bayes_bills.trainForCongress, pooled, path, processes = 2)
+        self.assertEqual(layout(pooled), layout(serial))
+
+class ClassifyParallelTest(unittest.TestCase):
+    def test_matches_serial(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        write_govtrack(root)
+
+        predictor = naivebayes(bayes_bills.getBillSubjects, flip=True)
+        for congress in (111, 112):
+            quietly(bayes_bills.trainForCongress, predictor, os.path.join(root, "data", "bills_%d" % congress), processes = 1)
+        bills = sorted(os.path.join(path, name) for path, dirs, files in os.walk(os.path.join(root, "data", "bills_113"))
+                       for name in files)
+        model = os.path.join(root, "predictor.model")
+
+        for threshold in (1.0, 1.01):
+            for cat in predictor.categories():
+                predictor.setthreshold(cat, threshold)
+            predictor.save(model)
+            predictor.compile()
+            serial = [(predictor.classifyfeatures(features), actual)
+                      for features, actual in map(bayes_bills.getBillFeatures, bills)]
+            pooled = classifyparallel(model, bayes_bills.getBillSubjects, bills, bayes_bills.getBillFeatures,
+                                      processes = 2, chunk = 4)
+            self.assertEqual(pooled, serial)
+
+# the counts of a voteclassifier, whatever length its rows have grown to
+def votecounts(predictor):
+    rows = [(cat, [list(row) + [0]*(len(predictor.subjects) - len(row)) for row in predictor.fc[cat]])
+            for cat in predictor.cats]
+    return list(predictor.voters.items()), list(predictor.subjects.items()), list(predictor.cc.items()), rows, predictor.total
+
+class TrainVotesParallelTest(unittest.TestCase):
+    def test_matches_serial(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        write_govtrack(root)
+        bills = quietly(bill_index, os.path.join(root, "bill_index.db"), os.path.join(root, "data"), 1)
+
+        serial = bayes_votes.voteclassifier()
+        pooled = bayes_votes.voteclassifier()
+        for congress in (111, 112):
+            path = os.path.join(root, "data", "votes_%d" % congress)
+            quietly(bayes_votes.trainPredictor, serial, path, bills, processes = 1)
+            quietly(bayes_votes.trainPredictor, pooled, path, bills, processes = 2, chunk = 4)
+        self.assertEqual(votecounts(pooled), votecounts(serial))
+
+        path = os.path.join(root, "data", "votes_113")
+        self.assertEqual(quietly(bayes_votes.predictOutcomes, pooled, path, bills),
+                         quietly(bayes_votes.predictOutcomes, serial, path, bills))
+
+if __name__ == "__main__":
+    unittest.main()
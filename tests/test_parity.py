@@ -0,0 +1,140 @@
+import os, shutil, sys, tempfile, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import bayes_bills
+import bayes_bills_distilled
+import bayes_votes
+from classifier import naivebayes
+from helpers.bill_index import bill_index
+
+import original
+from fixtures import write_govtrack, quietly
+
+# Pins the answers bayes_bills.py, bayes_bills_distilled.py and bayes_votes.py
+# gave with their own copies of the classifier (see original.py) against the
+# shared engine in classifier.py, with and without thresholds.
+
+DISTILLED = os.path.join(ROOT, "data_distilled", "data_distilled_%d.csv")
+THRESHOLDS = [1.3, 2.0]
+
+# runs fn without its progress output
+# a temporary copy of the GovTrack fixture, as the working directory
+class GovTrackTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        write_govtrack(self.root)
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+
+class DistilledParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.predictor = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        cls.copy = original.distilledbayes(original.get_features)
+        for congress in (111, 112):
+            bayes_bills_distilled.train_with_distilled(cls.predictor, DISTILLED % congress)
+            original.train_with_distilled(cls.copy, DISTILLED % congress)
+
+    def setUp(self):
+        self.predictor.thresholds = {}
+        self.copy.thresholds = {}
+        self.predictor.compile()
+
+    def test_accuracy_on_113(self):
+        correct, bills = bayes_bills_distilled.accuracy(*bayes_bills_distilled.predict_file(self.predictor, DISTILLED % 113))
+        self.assertEqual(bills, 10615)
+        self.assertEqual("%.5f" % (100.0*correct/bills), "97.21149")
+
+    def test_matches_copy(self):
+        predicted, actual = bayes_bills_distilled.predict_file(self.predictor, DISTILLED % 113)
+        self.assertEqual(list(zip(predicted, actual)), original.predict_distilled(self.copy, DISTILLED % 113))
+
+    def test_classify_many(self):
+        rows = [data for data, result in bayes_bills_distilled.read_distilled(DISTILLED % 113)]
+        predicted, actual = bayes_bills_distilled.predict_file(self.predictor, DISTILLED % 113)
+        self.assertEqual(bayes_bills_distilled.classify_many(self.predictor, rows), predicted)
+
+    def test_matches_copy_uncompiled(self):
+        rows = list(bayes_bills_distilled.read_distilled(DISTILLED % 113))[:500]
+        self.predictor.compiled = False
+        self.assertEqual([self.predictor.classify(data) for data, result in rows],
+                         [self.copy.classify(data) for data, result in rows])
+
+    def test_thresholds(self):
+        for t in THRESHOLDS:
+            for cat in (0, 1):
+                self.predictor.setthreshold(cat, t)
+                self.copy.setthreshold(cat, t)
+            predicted, actual = bayes_bills_distilled.predict_file(self.predictor, DISTILLED % 113)
+            self.assertIn(None, predicted)
+            self.assertEqual(list(zip(predicted, actual)), original.predict_distilled(self.copy, DISTILLED % 113))
+
+    # the bill predictors answer with the category they didn't pick
+    def test_flip(self):
+        unflipped = naivebayes(bayes_bills_distilled.get_features)
+        unflipped.merge(self.predictor)
+        unflipped.compile()
+        rows = [data for data, result in bayes_bills_distilled.read_distilled(DISTILLED % 113)]
+        self.assertEqual([1 - best for best in unflipped.batchclassify(rows)], self.predictor.batchclassify(rows))
+
+class DecideTest(unittest.TestCase):
+    # the copies raised or answered for a category they didn't pick when no
+    # category was positive; the engine leaves those items undecided
+    def test_nothing_positive(self):
+        predictor = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        self.assertIsNone(predictor.decide({0: -2.0, 1: -1.0}))
+        self.assertEqual(predictor.decide({1: -5.0, 2: -3.0}, "unknown"), "unknown")
+        self.assertEqual(predictor.decide({0: 0.0}, "unknown"), "unknown")
+        self.assertEqual(predictor.decide({0: 2.0, 1: -1.0}), 1)
+
+class BillsParityTest(GovTrackTestCase):
+    def predictions(self, predictor, copy):
+        results = original.predictBills(copy, "data/bills_113")
+        self.assertEqual([predictor.classify(bill) for bill, predicted, actual in results],
+                         [predicted for bill, predicted, actual in results])
+        predictor.compile()
+        self.assertEqual([predictor.classify(bill) for bill, predicted, actual in results],
+                         [predicted for bill, predicted, actual in results])
+        return [predicted for bill, predicted, actual in results]
+
+    def test_matches_copy(self):
+        predictor = naivebayes(bayes_bills.getBillSubjects, flip=True)
+        copy = original.billsbayes(original.getBillFeatures)
+        for congress in ("data/bills_111", "data/bills_112"):
+            quietly(bayes_bills.trainForCongress, predictor, congress, processes=1)
+            original.trainForCongress(copy, congress)
+        self.assertEqual(list(predictor.categories()), list(copy.categories()))
+
+        self.assertEqual(set(self.predictions(predictor, copy)), {0, 1})
+        for cat in copy.categories():
+            predictor.setthreshold(cat, 1.01)
+            copy.setthreshold(cat, 1.01)
+        self.assertIn(None, self.predictions(predictor, copy))
+
+class VotesParityTest(GovTrackTestCase):
+    def test_matches_copy(self):
+        bills = quietly(bill_index, "bill_index.db", "data", 1)
+        predictor = bayes_votes.voteclassifier()
+        copy = original.votesbayes(original.getVoteFeatures)
+        for congress in ("data/votes_111", "data/votes_112"):
+            quietly(bayes_votes.trainPredictor, predictor, congress, bills, processes=1)
+            original.trainPredictor(copy, congress)
+
+        accuracy = quietly(bayes_votes.predictOutcomes, predictor, "data/votes_113", bills)
+        self.assertEqual(accuracy, original.predictOutcomes(copy, "data/votes_113"))
+        self.assertGreater(accuracy[0], accuracy[1] / 2)
+
+        for cat in (0, 1):
+            predictor.setthreshold(cat, 1.0001)
+            copy.setthreshold(cat, 1.0001)
+        thresholded = quietly(bayes_votes.predictOutcomes, predictor, "data/votes_113", bills)
+        self.assertEqual(thresholded, original.predictOutcomes(copy, "data/votes_113"))
+        self.assertLess(thresholded[0], accuracy[0])
+
+if __name__ == "__main__":
+    unittest.main()
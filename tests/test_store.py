@@ -0,0 +1,60 @@
+import os, shutil, sys, tempfile, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import bayes_bills_distilled
+from classifier import naivebayes
+from helpers import distill
+
+from fixtures import write_govtrack, quietly, counts
+
+# Training from the SQLite store that `helpers/distill.py --3NF` loads gives the
+# counts training on the distilled files does.
+
+class StoreTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+        write_govtrack(cls.root)
+        cls.database = os.path.join(cls.root, "congress.db")
+        cls.distilled = {}
+        for congress in (111, 112, 113):
+            bills = os.path.join(cls.root, "data", "bills_%d" % congress)
+            cls.distilled[congress] = os.path.join(cls.root, "distilled_%d.csv" % congress)
+            quietly(distill.distill_1NF, bills, cls.distilled[congress], 1)
+            quietly(distill.distill_3NF, bills, cls.root, cls.database, 1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root)
+
+    def test_counts_match_the_distilled_files(self):
+        stored = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        bayes_bills_distilled.train_from_store(stored, self.database, [111, 112])
+        distilled = naivebayes(bayes_bills_distilled.get_features, flip=True)
+        for congress in (111, 112):
+            bayes_bills_distilled.train_with_distilled(distilled, self.distilled[congress])
+
+        self.assertEqual(counts(stored), counts(distilled))
+        self.assertEqual(list(stored.cc), list(distilled.cc))
+        self.assertEqual(stored.total, distilled.total)
+
+        stored.compile()
+        distilled.compile()
+        predicted = bayes_bills_distilled.predict_rows(stored, bayes_bills_distilled.read_store(self.database, 113))
+        self.assertEqual(predicted, bayes_bills_distilled.predict_file(distilled, self.distilled[113]))
+
+    def test_rows_match_the_distilled_files(self):
+        for congress in (111, 112, 113):
+            stored = [(sorted(subjects), sponsor, status) for (sponsor, subjects), status
+                      in bayes_bills_distilled.read_store(self.database, congress)]
+            distilled = [(sorted(subjects), sponsor, status) for (sponsor, subjects), status
+                         in bayes_bills_distilled.read_distilled(self.distilled[congress])]
+            # every bill of the fixture but hr1, which has no subjects
+            self.assertEqual(len(stored), 34)
+            self.assertEqual(stored, distilled)
+
+if __name__ == "__main__":
+    unittest.main()
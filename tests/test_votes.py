@@ -0,0 +1,138 @@
+import contextlib, io, json, os, shutil, sys, tempfile, unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bayesian_classifer"))
+
+import bayes_votes
+from classifier import naivebayes
+from helpers.bill_index import bill_index, bill_key
+
+from fixtures import write_govtrack, write_json, bill_path, VOTERS, SUBJECTS, CONGRESSES, BILLS, quietly
+
+# The voter x subject vote engine against naivebayes trained on one
+# (voter, subject) feature per pair, the way bayes_votes.py used to train,
+# and the bill index the roll calls are read against.
+
+def pair(item):
+    return [item]
+
+class VoteClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        write_govtrack(self.root)
+        self.bills = quietly(bill_index, os.path.join(self.root, "bill_index.db"), os.path.join(self.root, "data"), 1)
+
+    def rollcalls(self, congress):
+        for path in bayes_votes.voteFiles(os.path.join(self.root, "data", "votes_%d" % congress)):
+            rollCall = bayes_votes.readRollCall(path, self.bills)
+            if rollCall is not None:
+                yield rollCall
+
+    def test_matches_naivebayes(self):
+        for weight, ap in ((1.0, 0.5), (2.0, 0.3)):
+            predictor = bayes_votes.voteclassifier(weight, ap)
+            pairs = naivebayes(pair, weight=weight, ap=ap)
+            for congress in (111, 112):
+                for votes, subjects in self.rollcalls(congress):
+                    predictor.trainrollcall(votes, subjects)
+                    for voter, cat in votes:
+                        for subject in subjects:
+                            pairs.train((voter, subject), cat)
+            pairs.compile()
+
+            # voters and subjects never trained on included
+            voters = VOTERS + ["V999999"]
+            subjects = SUBJECTS + ["Unheard of"]
+            expected = [pairs.classify((voter, subject)) for voter in voters for subject in subjects]
+            self.assertEqual(predictor.classifyrollcall(voters, subjects), expected)
+            self.assertEqual(set(expected), {0, 1})
+
+            # thresholds set after scoring apply to the memoized decisions
+            for cat in (0, 1):
+                predictor.setthreshold(cat, 1.0001)
+                pairs.setthreshold(cat, 1.0001)
+            expected = [pairs.classify((voter, subject)) for voter in voters for subject in subjects]
+            self.assertEqual(predictor.classifyrollcall(voters, subjects), expected)
+            self.assertIn(None, expected)
+
+    def test_untrained(self):
+        predictor = bayes_votes.voteclassifier()
+        self.assertEqual(predictor.classifyrollcall(["V000001", "V000002"], ["Taxation"], "unknown"), ["unknown"]*2)
+
+class ReadRollCallTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        write_govtrack(self.root)
+        self.bills = quietly(bill_index, os.path.join(self.root, "bill_index.db"), os.path.join(self.root, "data"), 1)
+        self.votes = os.path.join(self.root, "data", "votes_111", "2111")
+
+    def test_unreadable(self):
+        path = os.path.join(self.votes, "h2", "data.json")
+        self.assertIsNotNone(bayes_votes.readRollCall(path, self.bills))
+        # the last roll call names a bill that doesn't exist, hr1 has no subjects
+        self.assertIsNone(bayes_votes.readRollCall(os.path.join(self.votes, "h%d" % (BILLS + 1), "data.json"), self.bills))
+        self.assertIsNone(bayes_votes.readRollCall(os.path.join(self.votes, "h1", "data.json"), self.bills))
+        self.assertIsNone(bayes_votes.readRollCall(os.path.join(self.votes, "h999", "data.json"), self.bills))
+        with open(path, "w") as vote_file:
+            vote_file.write("{")
+        self.assertIsNone(bayes_votes.readRollCall(path, self.bills))
+
+    # anything else is a bug, and isn't taken for a roll call that can't be read
+    def test_errors_are_raised(self):
+        def bill_key(congress, bill_type, number):
+            raise AttributeError("broken")
+        with mock.patch.object(bayes_votes, "bill_key", bill_key):
+            with self.assertRaises(AttributeError):
+                bayes_votes.readRollCall(os.path.join(self.votes, "h2", "data.json"), self.bills)
+
+class BillIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        write_govtrack(self.root)
+        self.data = os.path.join(self.root, "data")
+        self.database = os.path.join(self.root, "bill_index.db")
+
+    def index(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            bills = bill_index(self.database, self.data, 1)
+        return bills, output.getvalue()
+
+    def test_matches_the_bill_files(self):
+        bills, output = self.index()
+        expected = {}
+        for congress in CONGRESSES:
+            for path, dirs, files in os.walk(os.path.join(self.data, "bills_%d" % congress)):
+                for name in files:
+                    with open(os.path.join(path, name)) as bill_file:
+                        data = json.load(bill_file)
+                    expected[os.path.basename(path) + "-%d" % congress] = (data.get("subjects"), data["sponsor"]["name"], data["status"])
+        self.assertEqual(bills, expected)
+        self.assertEqual(bills[bill_key(111, "hr", 1)][0], None)
+
+    # only the congresses whose bills changed are parsed again
+    def test_refresh(self):
+        bills, output = self.index()
+        self.assertEqual(output.count("indexed"), len(CONGRESSES))
+        self.assertEqual(self.index(), (bills, ""))
+
+        path = bill_path(self.root, 112, "hr", 5)
+        with open(path) as bill_file:
+            data = json.load(bill_file)
+        data["subjects"] = ["Something new"]
+        write_json(path, data)
+        os.utime(path, ns = (os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+
+        refreshed, output = self.index()
+        self.assertEqual(output.strip(), "indexed 35 bills in %s" % os.path.join(self.data, "bills_112"))
+        self.assertEqual(refreshed[bill_key(112, "hr", 5)][0], ["Something new"])
+        del refreshed[bill_key(112, "hr", 5)], bills[bill_key(112, "hr", 5)]
+        self.assertEqual(refreshed, bills)
+
+if __name__ == "__main__":
+    unittest.main()